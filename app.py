@@ -1,16 +1,28 @@
 from flask import Flask, redirect, request, jsonify, json
 import requests, re, threading, time, os, jwt, datetime, urllib.parse
 from functools import wraps
+from concurrent.futures import Future
 from auxfns.searchroute import searchroute
+from auxfns.routeindex import route_fields
+from auxfns.routecache import invalidate_routes
+from auxfns.navdata import resolve_fixes, get_airway, load_navdata
+from auxfns.procedures import star_waypoints, sid_waypoints
+from auxfns.expandroute import expand_route, expand_routes
+from auxfns.snapshot import snapshot_version, load_snapshot
+from auxfns.compress import encode_body, negotiate
+from auxfns.stream import subscribe, aircraft_events
+from auxfns.tracks import trails, start_recorder, TRACK_FIELDS
+from auxfns.leader import start_refresher
+from auxfns.invalidation import start_invalidation_bus
+from auxfns.metrics import command_timer, observe, clear_run_dir, start_metrics_flusher, render as render_metrics
+from auxfns.traffic import current_traffic, aircraft_in_radius, aircraft_in_bbox, lookup_flight_plan, DJB_LAT, DJB_LON
 from pymongo import MongoClient, DESCENDING
 from bson.objectid import ObjectId
-from bson.json_util import dumps  # Helps with MongoDB's ObjectId serialization
 from dotenv import load_dotenv
 from flask_cors import CORS
 from google.oauth2 import id_token
 from google.auth.transport.requests import Request 
 from math import radians, cos, sin, asin, sqrt
-from update_cache import finddist
 
 
 
@@ -21,8 +33,8 @@ from pymongo import MongoClient
 
 MONGO_URI = os.getenv("MONGO_URI")
 
-
-client = MongoClient(MONGO_URI)
+# Connects on first use, in the worker rather than the preloaded master
+client = MongoClient(MONGO_URI, event_listeners=[command_timer], connect=False)
 
 db = client["ids"]
 routes_collection = db["routes"]
@@ -59,6 +71,15 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 AUTHORIZED_EMAILS = os.getenv("AUTHORIZED_EMAILS", "").split(",")
 ATIS_AIRPORTS = os.getenv("ATIS_AIRPORTS", "").split(",")
+# Run update_cache's refresher inside the app, in whichever worker holds the lease
+EMBEDDED_REFRESHER = os.getenv("EMBEDDED_REFRESHER", "").lower() in ("1", "true", "yes")
+
+# In a preloaded gunicorn master: start its workers' metrics from zero
+clear_run_dir()
+
+# Build the fix/navaid/airway index at import, so a preloaded gunicorn
+# master does it once for all workers
+load_navdata()
 
 with open("data/runway_flow.json", "r") as f:
     RUNWAY_FLOW_MAP = json.load(f)
@@ -82,6 +103,89 @@ def jwt_required(func):
         return func(*args, **kwargs)
     return wrapper
 
+REFERENCE_MAX_AGE = 86400  # seconds; fixes, airways and procedures only change with the AIRAC cycle
+
+def with_version(response, version):
+    """
+    Expose a cache snapshot's version as the response ETag and Last-Modified.
+    no-cache makes clients revalidate every poll, which not_modified answers cheaply.
+    The ETag is weak because the bytes differ per Content-Encoding.
+    """
+    response.vary.add("Accept-Encoding")
+    if version is not None:
+        response.set_etag(str(version), weak=True)
+        response.last_modified = version / 1000
+        response.cache_control.no_cache = True
+    return response
+
+def not_modified(version):
+    """
+    A 304 if the client already holds this snapshot version, else None.
+    Checked before the snapshot is read or anything is encoded.
+    """
+    if version is None:
+        return None
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(str(version)):
+            return None
+    elif not (request.if_modified_since and request.if_modified_since.timestamp() >= version // 1000):
+        return None
+    return with_version(app.response_class(status=304), version)
+
+def json_body(payload):
+    """
+    Serialize once, the way jsonify would, and compress in every encoding we
+    serve, so a snapshot's body is reused as is until its version changes.
+    """
+    return encode_body(app.json.dumps(payload, separators=(",", ":")) + "\n")
+
+def encoded_response(bodies, version):
+    """Response from json_body output, in the encoding the client prefers."""
+    encoding, body = negotiate(bodies, request.accept_encodings)
+    response = app.response_class(body, mimetype="application/json")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    return with_version(response, version)
+
+def cache_reference(response):
+    """Let browsers and a CDN keep static navdata responses."""
+    response.cache_control.public = True
+    response.cache_control.max_age = REFERENCE_MAX_AGE
+    return response
+
+def start_background_threads():
+    """
+    Per-worker threads: track recorder, invalidation bus, metrics flusher and
+    the refresher lease. Started by gunicorn's post_fork hook (gunicorn.conf.py),
+    since threads started in the preloaded master don't survive the fork.
+    """
+    # Trails need every refresh, not just the ones a request happens to load
+    start_recorder()
+    start_invalidation_bus()
+    start_metrics_flusher()
+    if EMBEDDED_REFRESHER:
+        start_refresher()
+
+@app.before_request
+def start_timer():
+    request.environ["ids.started"] = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    started = request.environ.get("ids.started")
+    if started is not None:
+        observe("ids_request_seconds", {
+            "endpoint": request.endpoint or "unmatched",
+            "method": request.method,
+            "status": str(response.status_code)
+        }, time.perf_counter() - started)
+    return response
+
+@app.route('/ids/metrics')
+def metrics():
+    # Prometheus scrape target; any worker answers with the sum over all of them
+    return app.response_class(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 #google login 
 @app.route('/ids/google-login', methods=['POST'])
 def google_login():
@@ -133,19 +237,25 @@ def google_login():
 
 
 
+def _airport_info_body(doc):
+    # Snapshots are keyed by CACHE_KEY, so the doc holds nothing jsonify can't encode
+    doc['_id'] = str(doc['_id'])
+    return json_body(doc)
+
 @app.route("/ids/airport_info")
 def airport_info():
     try:
-        # Get the most recent cache document
-        latest_cache = atis_cache.find_one(sort=[("updatedAt", -1)])
-
-
-        if not latest_cache:
+        version = snapshot_version(atis_cache)
+        cached = not_modified(version)
+        if cached:
+            return cached
+
+        # Get the current cache snapshot, encoded once per version
+        body = load_snapshot(atis_cache, _airport_info_body)
+        if not body:
             return jsonify({"error": "No airport info available"}), 503
 
-        # Convert MongoDB doc to JSON-friendly format
-        latest_cache['_id'] = str(latest_cache['_id'])
-        return jsonify(json.loads(dumps(latest_cache)))
+        return encoded_response(body, version)
         
 
     except Exception as e:
@@ -170,20 +280,24 @@ def update_route(route_id):
         return jsonify({"error": "No data provided"}), 400
 
     # Update the route in the database
-    result = routes_collection.update_one(
+    fields = {
+        "origin": data.get('origin'),
+        "destination": data.get('destination'),
+        "route": data.get('route'),
+        "altitude": data.get('altitude'),
+        "notes": data.get('notes'),
+    }
+    previous = routes_collection.find_one_and_update(
         {"_id": ObjectId(route_id)},
-        {"$set": {
-            "origin": data.get('origin'),
-            "destination": data.get('destination'),
-            "route": data.get('route'),
-            "altitude": data.get('altitude'),
-            "notes": data.get('notes'),
-        }}
+        {"$set": {**fields, **route_fields(fields)}},
+        projection={"destination": 1}
     )
 
-    if result.matched_count == 0:
+    if previous is None:
         return jsonify({"error": "Route not found"}), 404
 
+    invalidate_routes(previous.get('destination'), fields['destination'])
+
     return jsonify({"message": "Route updated successfully"}), 200
 
 # DELETE endpoint to delete a crossing
@@ -191,11 +305,16 @@ def update_route(route_id):
 @jwt_required
 def delete_route(route_id):
     # Delete the route from the database
-    result = routes_collection.delete_one({"_id": ObjectId(route_id)})
+    deleted = routes_collection.find_one_and_delete(
+        {"_id": ObjectId(route_id)},
+        projection={"destination": 1}
+    )
 
-    if result.deleted_count == 0:
+    if deleted is None:
         return jsonify({"error": "Route not found"}), 404
 
+    invalidate_routes(deleted.get('destination'))
+
     return jsonify({"message": "Route deleted successfully"}), 200
 
 # POST endpoint to create a new crossing
@@ -223,7 +342,9 @@ def create_route():
         "altitude": altitude,
         "notes": data.get('notes'),
     }
+    new_route.update(route_fields(new_route))
     result = routes_collection.insert_one(new_route)
+    invalidate_routes(new_route['destination'])
 
     return jsonify({
         "message": "Route created successfully",
@@ -245,25 +366,9 @@ def get_fix():
     else:
         return jsonify({'error': 'Missing fix or fixes parameter'}), 400
 
-    results = {}
-
-    for fix in fix_list:
-        fix_doc = fixes_collection.find_one({'FIX_ID': fix})
-        if fix_doc and fix_doc.get('LAT_DECIMAL') is not None and fix_doc.get('LONG_DECIMAL') is not None:
-            results[fix] = {
-                'lat': fix_doc['LAT_DECIMAL'],
-                'lon': fix_doc['LONG_DECIMAL']
-            }
-            continue
-
-        nav_doc = navaids_collection.find_one({'NAV_ID': fix})
-        if nav_doc and nav_doc.get('LAT_DECIMAL') is not None and nav_doc.get('LONG_DECIMAL') is not None:
-            results[fix] = {
-                'lat': nav_doc['LAT_DECIMAL'],
-                'lon': nav_doc['LONG_DECIMAL']
-            }
-
-    return jsonify(results)
+    # Answer in request order; jsonify would sort the identifiers
+    body = app.json.dumps(resolve_fixes(fix_list), sort_keys=False, separators=(",", ":")) + "\n"
+    return cache_reference(app.response_class(body, mimetype="application/json"))
 
 @app.route('/ids/airway')
 def expand_airway():
@@ -274,26 +379,25 @@ def expand_airway():
     if not airway_id:
         return jsonify({'error': 'Missing airway ID'}), 400
 
-    airway_doc = airway_collection.find_one({'AWY_ID': airway_id})
-    if not airway_doc:
+    airway = get_airway(airway_id)
+    if not airway:
         return jsonify({'error': f'Airway {airway_id} not found'}), 404
 
-    fixes = airway_doc['AIRWAY_STRING'].split()
+    fixes, positions = airway
 
     # If both 'from' and 'to' are provided, return only that segment
     if start and end:
-        try:
-            i = fixes.index(start)
-            j = fixes.index(end)
-        except ValueError:
+        i = positions.get(start)
+        j = positions.get(end)
+        if i is None or j is None:
             return jsonify({'error': f'Either {start} or {end} not part of airway {airway_id}'}), 400
 
         if i <= j:
             segment = fixes[i:j+1]
         else:
-            segment = list(reversed(fixes[j:i+1]))
+            segment = fixes[j:i+1][::-1]
 
-        return jsonify({'segment': segment})
+        return cache_reference(jsonify({'segment': segment}))
 
     # If only one of start/end is provided → invalid
     elif start or end:
@@ -301,7 +405,7 @@ def expand_airway():
 
     # If neither is provided → return full airway
     else:
-        return jsonify({'segment': fixes})
+        return cache_reference(jsonify({'segment': fixes}))
 
 @app.route('/ids/star')
 def get_star_transition():
@@ -309,49 +413,14 @@ def get_star_transition():
     if not code:
         return jsonify({'error': 'Missing STAR transition code'}), 400
 
-    # Shared ARPT_RWY_ASSOC filter
-    runway_filter = {
-        '$or': [
-            {'ARPT_RWY_ASSOC': {'$exists': False}},
-            {'ARPT_RWY_ASSOC': ''},
-            {'ARPT_RWY_ASSOC': {'$not': re.compile(r'/')}}
-        ]
-    }
-
-    # First try: search by TRANSITION_COMPUTER_CODE
-    rte_cursor = list(star_rte_collection.find({
-        'TRANSITION_COMPUTER_CODE': code,
-        **runway_filter
-    }).sort('POINT_SEQ', DESCENDING))
-
-    if not rte_cursor:
-        rte_cursor = list(star_rte_collection.find({
-            'STAR_COMPUTER_CODE': code,
-            'ROUTE_NAME': {'$not': re.compile(r'TRANSITION', re.IGNORECASE)},
-            **runway_filter
-        }).sort('POINT_SEQ', DESCENDING))
-
-    waypoints = []
-    for doc in rte_cursor:
-        point = doc.get('POINT')
-        if point and point not in waypoints:
-            waypoints.append(point)
-
+    waypoints = star_waypoints(code)
     if not waypoints:
-        # Fallback for STAR: return part after the dot if code contains dot
-        if '.' in code:
-            _, after_dot = code.split('.', 1)
-            return jsonify({
-                'transition': code,
-                'waypoints': [after_dot]
-            })
-        else:
-            return jsonify({'error': f'No valid waypoints found for {code}'}), 404
+        return jsonify({'error': f'No valid waypoints found for {code}'}), 404
 
-    return jsonify({
+    return cache_reference(jsonify({
         'transition': code,
         'waypoints': waypoints
-    })
+    }))
 
 @app.route('/ids/sid')
 def get_sid_transition():
@@ -359,53 +428,149 @@ def get_sid_transition():
     if not code:
         return jsonify({'error': 'Missing SID transition code'}), 400
 
-    # Shared ARPT_RWY_ASSOC filter
-    runway_filter = {
-        '$or': [
-            {'ARPT_RWY_ASSOC': {'$exists': False}},
-            {'ARPT_RWY_ASSOC': ''},
-            {'ARPT_RWY_ASSOC': {'$not': re.compile(r'/')}}
-        ]
-    }
-
-    # First try: search by TRANSITION_COMPUTER_CODE
-    rte_cursor = list(dp_rte_collection.find({
-        'TRANSITION_COMPUTER_CODE': code,
-        **runway_filter
-    }).sort('POINT_SEQ', DESCENDING))  # Note: ASCENDING for SIDs
-
-    # Fallback: search by SID_COMPUTER_CODE if nothing found
-    if not rte_cursor:
-        rte_cursor = list(dp_rte_collection.find({
-            'SID_COMPUTER_CODE': code,
-            **runway_filter
-        }).sort('POINT_SEQ', DESCENDING))
-
-    waypoints = []
-    for doc in rte_cursor:
-        point = doc.get('POINT')
-        if point and point not in waypoints:
-            waypoints.append(point)
-
+    waypoints = sid_waypoints(code)
     if not waypoints:
-        # Fallback for SID: return part before the dot if code contains dot
-        if '.' in code:
-            before_dot = code.split('.', 1)[0]
-            before_dot = before_dot[:-1]
-            return jsonify({
-                'transition': code,
-                'waypoints': [before_dot]
-            })
-        else:
-            return jsonify({'error': f'No valid waypoints found for {code}'}), 404
+        return jsonify({'error': f'No valid waypoints found for {code}'}), 404
 
-    return jsonify({
+    return cache_reference(jsonify({
         'transition': code,
         'waypoints': waypoints
-    })
+    }))
+
+MAX_EXPAND_ROUTES = 1000
+
+@app.route('/ids/expand-route', methods=['GET', 'POST'])
+def api_expand_route():
+    # Batch: {"routes": [{"id": ..., "route": ..., "departure": ..., "arrival": ...}, ...]}
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        items = data.get('routes')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': "'routes' must be a non-empty list"}), 400
+        if len(items) > MAX_EXPAND_ROUTES:
+            return jsonify({'error': f'At most {MAX_EXPAND_ROUTES} routes per request'}), 400
+        if not all(isinstance(item, dict) and isinstance(item.get('route'), str)
+                   and isinstance(item.get('departure') or '', str) and isinstance(item.get('arrival') or '', str)
+                   for item in items):
+            return jsonify({'error': "Each entry needs a 'route' string; 'departure' and 'arrival' must be strings"}), 400
+
+        return jsonify({'routes': expand_routes(items)})
+
+    route = request.args.get('route', '')
+    if not route.strip():
+        return jsonify({'error': 'Missing route parameter'}), 400
+
+    departure = request.args.get('departure', '')
+    arrival = request.args.get('arrival', '')
+    return jsonify(expand_route(route, departure, arrival))
+
+# (version, json_body) of the expanded routes of the last aircraft snapshot. Requests
+# arriving while a snapshot's routes are being expanded wait for that build.
+_aircraft_routes = {"entry": None, "inflight": None}  # inflight: (version, Future)
+_aircraft_routes_lock = threading.Lock()
+
+def _expanded_routes(snapshot):
+    """(version, json_body) for a snapshot, expanded once however many requests ask at the same time."""
+    version = snapshot["version"]
+    with _aircraft_routes_lock:
+        entry = _aircraft_routes["entry"]
+        if entry is not None and entry[0] == version:
+            return entry
+        inflight = _aircraft_routes["inflight"]
+        leader = inflight is None or inflight[0] != version
+        if leader:
+            inflight = _aircraft_routes["inflight"] = (version, Future())
+
+    if not leader:
+        return inflight[1].result()
+
+    try:
+        items = [{
+            'id': ac.get('callsign'),
+            'route': ac.get('route') or '',
+            'departure': ac.get('departure') or '',
+            'arrival': ac.get('destination') or ''
+        } for ac in snapshot["aircraft"]]
+
+        entry = (version, json_body({
+            'version': version,
+            'updatedAt': snapshot['updatedAt'],
+            'routes': expand_routes(items)
+        }))
+    except Exception as e:
+        with _aircraft_routes_lock:
+            if _aircraft_routes["inflight"] is inflight:
+                _aircraft_routes["inflight"] = None
+        inflight[1].set_exception(e)
+        raise
+
+    with _aircraft_routes_lock:
+        # A build for a newer snapshot may have finished first
+        current = _aircraft_routes["entry"]
+        if current is None or current[0] < version:
+            _aircraft_routes["entry"] = entry
+        if _aircraft_routes["inflight"] is inflight:
+            _aircraft_routes["inflight"] = None
+    inflight[1].set_result(entry)
+    return entry
+
+@app.route('/ids/aircraft/routes')
+def aircraft_routes():
+    try:
+        version = snapshot_version(aircraft_cache)
+        cached = not_modified(version)
+        if cached:
+            return cached
+        snapshot = current_traffic()
+        if not snapshot:
+            return jsonify({"error": "Cache unavailable"}), 503
+    except Exception as e:
+        print(f"Error reading aircraft cache from MongoDB: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    entry = _expanded_routes(snapshot)
+    return encoded_response(entry[1], entry[0])
 
 
 DEFAULT_RADIUS = 400  # nm
+PRERENDERED_AIRCRAFT = [(DEFAULT_RADIUS, False), (DEFAULT_RADIUS, True)]  # (radius, ground) rendered with each snapshot
+MAX_RENDERED_AIRCRAFT = 16  # DJB-centered (radius, ground) bodies kept per snapshot
+
+# (version, {(radius, ground): json_body}) for aircraft around DJB
+_aircraft_bodies = {"entry": None}
+
+def _render_aircraft(snapshot, radius, include_ground):
+    return json_body({
+        "version": snapshot["version"],
+        "aircraft": aircraft_in_radius(snapshot, DJB_LAT, DJB_LON, radius, include_ground)
+    })
+
+def _aircraft_body(snapshot, radius, include_ground):
+    """
+    DJB-centered /ids/aircraft body, serialized and compressed once per
+    snapshot. The common combinations are rendered as soon as a new snapshot
+    is seen; others on their first request, up to MAX_RENDERED_AIRCRAFT.
+    """
+    entry = _aircraft_bodies["entry"]
+    if entry is None or entry[0] != snapshot["version"]:
+        entry = (snapshot["version"], {key: _render_aircraft(snapshot, *key) for key in PRERENDERED_AIRCRAFT})
+        _aircraft_bodies["entry"] = entry
+
+    bodies = entry[1]
+    key = (radius, include_ground)
+    body = bodies.get(key)
+    if body is None:
+        body = _render_aircraft(snapshot, radius, include_ground)
+        if len(bodies) < MAX_RENDERED_AIRCRAFT:
+            bodies[key] = body
+    return body
+
+def parse_bbox(value):
+    """'west,south,east,north' (Leaflet's toBBoxString order) -> (south, west, north, east)"""
+    west, south, east, north = (float(v) for v in value.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError(value)
+    return south, west, north, east
 
 @app.route('/ids/aircraft')
 def aircraft():
@@ -414,33 +579,105 @@ def aircraft():
     except ValueError:
         radius = DEFAULT_RADIUS
     includeOnGround = request.args.get("ground", "false").lower() in ("true", "1", "yes")
+
+    # Center defaults to DJB; a bbox (map viewport) replaces the radius search
+    bbox = request.args.get("bbox")
+    try:
+        if bbox:
+            bbox = parse_bbox(bbox)
+        lat = float(request.args.get("lat", DJB_LAT))
+        lon = float(request.args.get("lon", DJB_LON))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(lat, lon)
+    except ValueError:
+        return jsonify({"error": "Invalid lat/lon or bbox (expected west,south,east,north)"}), 400
+
     try:
-        cached_data = aircraft_cache.find_one({}, {"_id": 0})  # Get the single cache doc
-        if not cached_data:
+        cached = not_modified(snapshot_version(aircraft_cache))
+        if cached:
+            return cached
+        snapshot = current_traffic()
+        if not snapshot:
             return jsonify({"error": "Cache unavailable"}), 503
     except Exception as e:
         print(f"Error reading aircraft cache from MongoDB: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
-    target_lat, target_lon = 41.2129, -82.9431
+    if not bbox and (lat, lon) == (DJB_LAT, DJB_LON):
+        return encoded_response(_aircraft_body(snapshot, radius, includeOnGround), snapshot["version"])
 
-    aircraft_list = cached_data.get("aircraft", [])
+    if bbox:
+        filtered = aircraft_in_bbox(snapshot, *bbox, includeOnGround)
+    else:
+        filtered = aircraft_in_radius(snapshot, lat, lon, radius, includeOnGround)
 
-    filtered = [
-        ac for ac in aircraft_list
-        if finddist(ac["lat"], ac["lon"], target_lat, target_lon) <= radius
-    ]
+    return with_version(jsonify({
+        "version": snapshot["version"],
+        "aircraft": filtered
+    }), snapshot["version"])
 
-    if not includeOnGround:
-        filtered = [ac for ac in filtered if ac["speed"] >= 50]
-    else:
-        pass
 
+@app.route('/ids/aircraft/counts')
+def aircraft_counts():
+    # Aircraft per ARTCC, as classified by update_cache from data/boundaries.geojson
+    try:
+        cached = not_modified(snapshot_version(aircraft_cache))
+        if cached:
+            return cached
+        snapshot = current_traffic()
+        if not snapshot:
+            return jsonify({"error": "Cache unavailable"}), 503
+    except Exception as e:
+        print(f"Error reading aircraft cache from MongoDB: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    return with_version(jsonify({
+        "version": snapshot["version"],
+        "artccCounts": snapshot["artccCounts"]
+    }), snapshot["version"])
+
+
+@app.route('/ids/aircraft/trails')
+def aircraft_trails():
+    bbox = request.args.get("bbox")
+    if not bbox:
+        return jsonify({"error": "Missing bbox (west,south,east,north)"}), 400
+    try:
+        bbox = parse_bbox(bbox)
+    except ValueError:
+        return jsonify({"error": "Invalid bbox (expected west,south,east,north)"}), 400
+    includeOnGround = request.args.get("ground", "false").lower() in ("true", "1", "yes")
+
+    try:
+        snapshot = current_traffic()
+        if not snapshot:
+            return jsonify({"error": "Cache unavailable"}), 503
+    except Exception as e:
+        print(f"Error reading aircraft cache from MongoDB: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    callsigns = [ac.get("callsign") for ac in aircraft_in_bbox(snapshot, *bbox, includeOnGround)]
+    # Points are [t, lat, lon, alt, gs], oldest first
     return jsonify({
-        "aircraft": filtered
+        "version": snapshot["version"],
+        "fields": TRACK_FIELDS,
+        "trails": trails(callsigns)
     })
 
 
+@app.route('/ids/aircraft/stream')
+def aircraft_stream():
+    # Server-sent events: the full aircraft list once, then a diff per refresh
+    q = subscribe()
+    if q is None:
+        return jsonify({"error": "Too many stream subscribers, poll /ids/aircraft instead"}), 503
+
+    response = app.response_class(aircraft_events(q), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # don't let a proxy hold events back
+    return response
+
+
 @app.route('/ids/crossings')
 def api_crossings():
     destination = request.args.get('destination', '').upper()
@@ -648,18 +885,27 @@ def create_enroute():
         "enroute_id": str(result.inserted_id)  # Return the ID of the newly created enroute
     }), 201
 
+def _controllers_body(doc):
+    return json_body({
+        "version": doc.get("version"),
+        "cacheUpdatedAt": doc.get("cacheUpdatedAt"),
+        "controllers": doc.get("controllers", []),
+        "tracon": doc.get("tracon", [])
+    })
+
 @app.route('/ids/controllers')
 def get_center_controllers():
     try:
-        doc = controller_cache.find_one({}, {"_id": 0})  # Exclude _id for cleaner response
-        if not doc:
+        version = snapshot_version(controller_cache)
+        cached = not_modified(version)
+        if cached:
+            return cached
+
+        body = load_snapshot(controller_cache, _controllers_body)
+        if not body:
             return jsonify({"error": "No controller data available"}), 503
         
-        return jsonify({
-            "cacheUpdatedAt": doc.get("cacheUpdatedAt"),
-            "controllers": doc.get("controllers", []),
-            "tracon": doc.get("tracon", [])
-        })
+        return encoded_response(body, version)
     except Exception as e:
         print(f"Error reading controller cache from MongoDB: {e}")
         return jsonify({"error": "Internal server error"}), 500
@@ -674,33 +920,26 @@ def route_to_skyvector():
         return "Missing callsign parameter", 400
 
     try:
-        print(f"Looking for: {callsign}")
-        datafeed = "https://data.vatsim.net/v3/vatsim-data.json"
-        response = requests.get(datafeed, timeout=5)
-        data = response.json()
-
-        for pilot in data.get('pilots', []):
-            current = pilot.get('callsign', '').upper()
-            if current == callsign:
-                fp = pilot.get('flight_plan')
-                if not fp:
-                    return f"No flight plan found for {callsign}", 404
-
-                dep = fp.get("departure", "").strip()
-                rte = fp.get("route", "").strip()
-                arr = fp.get("arrival", "").strip()
-
-                if not (dep and arr):
-                    return "Flight plan is missing departure or arrival", 400
-
-                full_route = f"{dep} {rte} {arr}".strip()
-                encoded = urllib.parse.quote(" ".join(full_route.split()))
-                return redirect(f"https://skyvector.com/?fpl={encoded}")
-
-        return f"Callsign {callsign} not found in VATSIM data", 404
+        fp = lookup_flight_plan(callsign)
+        if fp is None:
+            return f"Callsign {callsign} not found in VATSIM data", 404
+        if not fp:
+            return f"No flight plan found for {callsign}", 404
+
+        dep = fp["departure"].strip()
+        rte = fp["route"].strip()
+        arr = fp["arrival"].strip()
+
+        if not (dep and arr):
+            return "Flight plan is missing departure or arrival", 400
+
+        full_route = f"{dep} {rte} {arr}".strip()
+        encoded = urllib.parse.quote(" ".join(full_route.split()))
+        return redirect(f"https://skyvector.com/?fpl={encoded}")
     except Exception as e:
         return f"Error: {str(e)}", 500
 
 
 if __name__ == "__main__":
+    start_background_threads()
     app.run()
\ No newline at end of file
@@ -0,0 +1,114 @@
+#ARTCC boundaries and point-in-polygon lookup
+from collections import Counter
+from flask import json
+import numpy as np
+
+BOUNDARY_GRID_DEG = 1.0
+BOUNDARY_GRID_ROWS = int(180 / BOUNDARY_GRID_DEG)
+BOUNDARY_GRID_COLS = int(360 / BOUNDARY_GRID_DEG)
+
+
+def artcc_id(feature_id):
+    """'KZOB' -> 'ZOB' like the controllers' artccId; sector pieces ('KZJX-A') fold into their ARTCC."""
+    ident = feature_id.split('-', 1)[0]
+    if len(ident) == 4 and ident.startswith('K'):
+        ident = ident[1:]
+    return ident
+
+
+def _load_polygons(path):
+    """
+    One entry per polygon ring set: (artcc, bbox, edges). Sector pieces are
+    skipped when the whole ARTCC is also in the file, since they only
+    subdivide it. edges is an (n, 4) array of x1, y1, x2, y2 over every ring.
+    """
+    with open(path, "r") as f:
+        features = json.load(f)["features"]
+
+    ids = {feature["properties"]["id"] for feature in features}
+    polygons = []
+    for feature in features:
+        feature_id = feature["properties"]["id"]
+        if '-' in feature_id and feature_id.split('-', 1)[0] in ids:
+            continue
+        geometry = feature["geometry"]
+        parts = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        for part in parts:
+            edges = []
+            for ring in part:
+                ring = np.asarray(ring, dtype=float)[:, :2]
+                edges.append(np.hstack([ring[:-1], ring[1:]]))
+            edges = np.vstack(edges)
+            bbox = (edges[:, 1].min(), edges[:, 0].min(), edges[:, 1].max(), edges[:, 0].max())  # south, west, north, east
+            polygons.append((artcc_id(feature_id), bbox, edges))
+    return polygons
+
+
+def _grid_cell(lat, lon):
+    rows = np.clip(((lat + 90) // BOUNDARY_GRID_DEG).astype(int), 0, BOUNDARY_GRID_ROWS - 1)
+    cols = ((lon + 180) // BOUNDARY_GRID_DEG).astype(int) % BOUNDARY_GRID_COLS
+    return rows * BOUNDARY_GRID_COLS + cols
+
+
+def _build_grid(polygons):
+    """covered[cell] is True where at least one polygon's bbox reaches, so points elsewhere skip every test."""
+    covered = np.zeros((BOUNDARY_GRID_ROWS, BOUNDARY_GRID_COLS), dtype=bool)
+    for _, (south, west, north, east), _ in polygons:
+        r0, r1 = (int((v + 90) // BOUNDARY_GRID_DEG) for v in (south, north))
+        c0, c1 = (int((v + 180) // BOUNDARY_GRID_DEG) for v in (west, east))
+        covered[max(r0, 0):min(r1, BOUNDARY_GRID_ROWS - 1) + 1, max(c0, 0):min(c1, BOUNDARY_GRID_COLS - 1) + 1] = True
+    return covered.ravel()
+
+
+POLYGONS = _load_polygons("data/boundaries.geojson")
+COVERED_CELLS = _build_grid(POLYGONS)
+
+
+def _inside(px, py, edges):
+    """Ray casting for many points against one polygon: a point is inside if a ray to +x crosses an odd number of edges."""
+    x1, y1, x2, y2 = (edges[:, i] for i in range(4))
+    py = py[:, None]
+    straddles = (y1 > py) != (y2 > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+    crossings = straddles & (px[:, None] < crossing_x)
+    return (crossings.sum(axis=1) % 2) == 1
+
+
+def classify(lat, lon):
+    """
+    ARTCC for each (lat, lon) as an object array (None outside every
+    boundary). Points in grid cells no boundary touches are never tested;
+    the rest are filtered by each polygon's bbox before ray casting.
+    """
+    # None becomes NaN and is never inside
+    lat = np.array(lat, dtype=float)
+    lon = np.array(lon, dtype=float)
+    result = np.full(len(lat), None, dtype=object)
+
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    pending = np.flatnonzero(valid)
+    pending = pending[COVERED_CELLS[_grid_cell(lat[pending], lon[pending])]]
+
+    for artcc, (south, west, north, east), edges in POLYGONS:
+        if len(pending) == 0:
+            break
+        plat = lat[pending]
+        plon = lon[pending]
+        near = (plat >= south) & (plat <= north) & (plon >= west) & (plon <= east)
+        if not near.any():
+            continue
+        candidates = pending[near]
+        hit = _inside(lon[candidates], lat[candidates], edges)
+        result[candidates[hit]] = artcc
+        # A point belongs to one ARTCC; stop testing it once found
+        pending = np.setdiff1d(pending, candidates[hit], assume_unique=True)
+    return result
+
+
+def tag_artccs(aircraft):
+    """Set 'artcc' on every aircraft record in one classify pass; returns ARTCC -> count, busiest first."""
+    artccs = classify([ac.get("lat") for ac in aircraft], [ac.get("lon") for ac in aircraft])
+    for ac, artcc in zip(aircraft, artccs):
+        ac["artcc"] = artcc
+    return dict(Counter(a for a in artccs if a).most_common())
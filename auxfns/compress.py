@@ -0,0 +1,31 @@
+#pre-compressed response bodies
+import gzip
+
+try:
+    import brotli
+except ImportError:  # optional, bodies are only gzipped without it
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5        # built once per snapshot, so trade a little ratio for speed
+MIN_COMPRESS_SIZE = 1024  # bytes; smaller bodies go out as is
+
+
+def encode_body(text):
+    """
+    The response bytes for a JSON body in every encoding we serve:
+    {"identity": ..., "gzip": ..., "br": ...}
+    """
+    raw = text.encode()
+    bodies = {"identity": raw}
+    if len(raw) >= MIN_COMPRESS_SIZE:
+        bodies["gzip"] = gzip.compress(raw, GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(raw, quality=BROTLI_QUALITY)
+    return bodies
+
+
+def negotiate(bodies, accept_encodings):
+    """(encoding, bytes) for the best encoding in Accept-Encoding, identity if none match."""
+    encoding = accept_encodings.best_match([e for e in ("br", "gzip") if e in bodies], default="identity")
+    return encoding, bodies[encoding]
@@ -1,4 +1,5 @@
 import requests, json
+import numpy as np
 from flask import jsonify
 from math import radians, cos, sin, asin, sqrt
 
@@ -10,6 +11,15 @@ def finddist(lat1, lon1, lat2, lon2):
     c = 2 * asin(sqrt(a))
     return R * c  # now returns nautical miles
 
+def finddist_np(lats, lons, lat, lon):
+    """Vectorized finddist: distances in nm from (lat, lon) to every point in the arrays."""
+    R = 3440.065  # Radius of Earth in nautical miles
+    lats = np.radians(lats)
+    lons = np.radians(lons)
+    lat, lon = radians(lat), radians(lon)
+    a = np.sin((lats - lat)/2)**2 + np.cos(lats) * cos(lat) * np.sin((lons - lon)/2)**2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
 def getCoords(radius_nm=300):
     url = "https://data.vatsim.net/v3/vatsim-data.json"
     headers = {'Accept': 'application/json'}
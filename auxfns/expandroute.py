@@ -0,0 +1,158 @@
+#flight plan route expansion
+import re
+from auxfns.navdata import resolve_fixes, get_airway
+from auxfns.procedures import sid_waypoints, star_waypoints
+
+# Tokens that carry no position: DCT, SID/STAR placeholders, flight rules
+SKIP_TOKENS = {"DCT", "SID", "STAR", "IFR", "VFR"}
+# Speed/level groups, e.g. N0450F350, M080F390, K0830S1130, F350
+SPEED_LEVEL_RE = re.compile(r'^(?:[NKM]\d{3,4})?(?:[FAMS]\d{3,4})$')
+# Named procedures, e.g. CLVIN1, GIBBZ2, HHOWE4A
+PROCEDURE_RE = re.compile(r'^[A-Z]{2,5}\d[A-Z]?$')
+# Coordinates, e.g. 4130N08200W or 41N082W
+LATLON_RE = re.compile(r'^(\d{2})(\d{2})?([NS])(\d{3})(\d{2})?([EW])$')
+
+
+def tokenize(route, departure='', arrival=''):
+    """Split a filed route into fix/airway/procedure tokens."""
+    departure = (departure or '').strip().upper()
+    arrival = (arrival or '').strip().upper()
+
+    tokens = []
+    for raw in (route or '').upper().split():
+        # Drop speed/level changes attached to a fix (ABC/N0450F350)
+        token = raw.split('/', 1)[0].strip('+')
+        if not token or token in SKIP_TOKENS or SPEED_LEVEL_RE.match(token):
+            continue
+        tokens.append(token)
+
+    if tokens and departure and tokens[0] == departure:
+        tokens = tokens[1:]
+    if tokens and arrival and tokens[-1] == arrival:
+        tokens = tokens[:-1]
+    return tokens
+
+
+def _parse_latlon(token):
+    match = LATLON_RE.match(token)
+    if not match:
+        return None
+    lat_deg, lat_min, ns, lon_deg, lon_min, ew = match.groups()
+    lat = int(lat_deg) + int(lat_min or 0) / 60
+    lon = int(lon_deg) + int(lon_min or 0) / 60
+    return {'lat': -lat if ns == 'S' else lat, 'lon': -lon if ew == 'W' else lon}
+
+
+def _airway_segment(airway_id, start, end):
+    """Same rules as /ids/airway: both ends must be on the airway."""
+    airway = get_airway(airway_id)
+    if not airway:
+        return None
+    fixes, positions = airway
+    i = positions.get(start)
+    j = positions.get(end)
+    if i is None or j is None:
+        return None
+    return fixes[i:j+1] if i <= j else fixes[j:i+1][::-1]
+
+
+def _procedure(kind, code, memo):
+    key = (kind, code)
+    if key not in memo:
+        lookup = sid_waypoints if kind == 'sid' else star_waypoints
+        memo[key] = lookup(code, fallback=False)
+    return memo[key]
+
+
+def _expand_tokens(tokens, memo):
+    """Returns (fix names in order, tokens that could not be expanded)."""
+    names = []
+    unresolved = []
+    last = len(tokens) - 1
+
+    for i, token in enumerate(tokens):
+        prev_token = tokens[i-1] if i > 0 else None
+        next_token = tokens[i+1] if i < last else None
+
+        # Airway between two fixes: add the fixes in between
+        if prev_token and next_token and get_airway(token):
+            segment = _airway_segment(token, prev_token, next_token)
+            if segment:
+                names.extend(segment[1:-1])
+            else:
+                unresolved.append(token)
+            continue
+
+        # SID at the start of the route, STAR at the end
+        if PROCEDURE_RE.match(token) and (i == 0 or i == last):
+            if i == 0:
+                codes = [f"{token}.{next_token}"] if next_token else []
+                kind = 'sid'
+            else:
+                codes = [f"{prev_token}.{token}"] if prev_token else []
+                kind = 'star'
+            waypoints = None
+            for code in codes + [token]:
+                waypoints = _procedure(kind, code, memo)
+                if waypoints:
+                    break
+            if waypoints:
+                names.extend(waypoints)
+            else:
+                unresolved.append(token)
+            continue
+
+        names.append(token)
+
+    # Procedures usually start or end on the neighbouring fix
+    deduped = []
+    for name in names:
+        if not deduped or deduped[-1] != name:
+            deduped.append(name)
+    return deduped, unresolved
+
+
+def expand_routes(items):
+    """
+    Expand a batch of filed routes into ordered fixes with coordinates.
+    Each item is a dict with 'route' and optionally 'departure', 'arrival'
+    and 'id'. Identical routes are expanded once, and all fixes in the
+    batch are resolved in a single lookup.
+    """
+    memo = {}
+    expansions = {}
+    for item in items:
+        key = (item.get('departure') or '', item.get('route') or '', item.get('arrival') or '')
+        if key not in expansions:
+            expansions[key] = _expand_tokens(tokenize(key[1], key[0], key[2]), memo)
+
+    all_names = [name for names, _ in expansions.values() for name in names]
+    coords = resolve_fixes([n for n in all_names if not LATLON_RE.match(n)])
+
+    results = []
+    for item in items:
+        key = (item.get('departure') or '', item.get('route') or '', item.get('arrival') or '')
+        names, unresolved = expansions[key]
+        fixes = []
+        missing = list(unresolved)
+        for name in names:
+            point = coords.get(name) or _parse_latlon(name)
+            if point:
+                fixes.append({'fix': name, 'lat': point['lat'], 'lon': point['lon']})
+            else:
+                missing.append(name)
+
+        result = {
+            'route': item.get('route') or '',
+            'fixes': fixes,
+            'unresolved': missing
+        }
+        if 'id' in item:
+            result = {'id': item['id'], **result}
+        results.append(result)
+
+    return results
+
+
+def expand_route(route, departure='', arrival=''):
+    return expand_routes([{'route': route, 'departure': departure, 'arrival': arrival}])[0]
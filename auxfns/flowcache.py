@@ -0,0 +1,117 @@
+#runway flow cache
+import threading
+import time
+from auxfns.flowdetect import RUNWAY_FLOW_MAP, departure_flow, fetch_datis, datis_text
+from auxfns.snapshot import CACHE_KEY
+from models.db import atis_cache
+
+FLOW_TTL = 120              # seconds a resolved flow is served before it is re-checked
+FLOW_STALE_LIMIT = 900      # seconds a stale flow may still be served while D-ATIS is failing
+ATIS_CACHE_MAX_AGE = 900    # seconds before the flow stored by update_cache is ignored
+
+# Per-worker memo in front of atis_cache: airport code -> (flow, resolved_at, checked_at).
+# resolved_at is when a lookup last answered, checked_at when one was last tried
+_flow_memo = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def _flow_from_atis_cache(airport_code):
+    """
+    Look up the flow update_cache.update_wx already worked out for this airport.
+    Returns (found, flow); found is False when the airport isn't in the cache
+    or the cache is too old to trust.
+    """
+    try:
+        doc = atis_cache.find_one(
+            {"_id": CACHE_KEY},
+            {"_id": 0, "version": 1, f"airports.K{airport_code}.flow": 1}
+        )
+    except Exception as e:
+        print(f"Error reading flow from atis cache for {airport_code}: {e}")
+        return False, None
+
+    if not doc:
+        return False, None
+
+    airport = doc.get("airports", {}).get(f"K{airport_code}")
+    if airport is None:
+        return False, None
+
+    # version is the write time in milliseconds
+    version = doc.get("version")
+    if not version or time.time() - version / 1000 > ATIS_CACHE_MAX_AGE:
+        return False, None
+
+    return True, airport.get("flow")
+
+
+def _flow_from_datis(airport_code):
+    """
+    Departure flow straight from D-ATIS, as (fetched, flow). fetched is False
+    when the ATIS couldn't be downloaded; a downloaded ATIS without a
+    recognizable flow is an answer, (True, None).
+    """
+    try:
+        datis = fetch_datis(airport_code)
+        if datis is None:
+            return False, None
+        return True, departure_flow(airport_code, datis_text(datis))
+    except Exception as e:
+        print(f"Error fetching D-ATIS flow for {airport_code}: {e}")
+        return False, None
+
+
+def _refresh(airport_code):
+    try:
+        found, flow = _flow_from_atis_cache(airport_code)
+        if not found:
+            # Not covered by update_cache (or its copy is old), ask D-ATIS directly
+            found, flow = _flow_from_datis(airport_code)
+
+        now = time.time()
+        previous = _flow_memo.get(airport_code)
+        if found:
+            _flow_memo[airport_code] = (flow, now, now)
+        elif previous and now - previous[1] < FLOW_STALE_LIMIT:
+            # D-ATIS failed: keep serving the last known flow, still aged from when it was resolved
+            _flow_memo[airport_code] = (previous[0], previous[1], now)
+        else:
+            _flow_memo[airport_code] = (None, previous[1] if previous else 0, now)
+    finally:
+        with _lock:
+            _refreshing.discard(airport_code)
+
+
+def _refresh_in_background(airport_code):
+    with _lock:
+        if airport_code in _refreshing:
+            return
+        _refreshing.add(airport_code)
+    threading.Thread(target=_refresh, args=(airport_code,), daemon=True).start()
+
+
+def get_cached_flow(airport_code):
+    """
+    Current runway flow for an airport, resolved at most once per FLOW_TTL.
+    Never calls D-ATIS on the caller's thread: expired entries are served
+    stale while a background refresh runs.
+    """
+    airport_code = airport_code.upper()
+    if airport_code not in RUNWAY_FLOW_MAP:
+        return None
+
+    now = time.time()
+    entry = _flow_memo.get(airport_code)
+    if entry and now - entry[2] < FLOW_TTL:
+        return entry[0]
+
+    if entry is None:
+        # Cold start: the shared atis_cache is one cheap read away
+        found, flow = _flow_from_atis_cache(airport_code)
+        if found:
+            _flow_memo[airport_code] = (flow, now, now)
+            return flow
+
+    _refresh_in_background(airport_code)
+    return entry[0] if entry else None
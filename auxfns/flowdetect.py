@@ -0,0 +1,138 @@
+#runway flow detection from D-ATIS text
+import re
+import itertools
+from flask import json
+from auxfns.http import session
+
+# Load your runway flow map once
+with open("data/runway_flow.json", "r") as f:
+    RUNWAY_FLOW_MAP = json.load(f)
+
+
+def _expand(*parts):
+    """Every phrase made from one choice per part, e.g. ILS X / ILS Y / ILS Z"""
+    return [" ".join(combo) for combo in itertools.product(*parts)]
+
+# Phrases that introduce the departure / arrival runways in a D-ATIS ("DEPG RWYS 21R, 22L")
+BOTH_PHRASES = ["LDG AND DEPG", "DEPG AND LDG"]
+DEPARTURE_PHRASES = ["DEPG", "DEPTG"]
+# Only the words right before RWY: "ILS APCH RWY" is covered by APCH, "APCHS IN USE RWYS" by IN USE
+ARRIVAL_PHRASES = ["LDG", "LNDG", "LANDING", "APCH", "APCHS", "IN USE", "ILS", "RNAV", "VISUAL"] + \
+    _expand(["APCH", "APCHS"], ["TO"]) + _expand(["ILS", "RNAV"], ["X", "Y", "Z"])
+
+RUNWAY = r"\d{1,2}[LRC]?(?!\d)"
+RUNWAY_RE = re.compile(RUNWAY)
+# Further runways listed after the first one: "21L, 22R" / "21L AND RWY 22R"
+RUNWAY_LIST = rf"(?:(?:\s*,\s*|\s+AND\s+|\s+)(?:RWYS?\s+)?{RUNWAY}\b)*"
+
+
+def _after(phrases):
+    # Fixed-width lookbehinds so the pattern can start with the literal RWY,
+    # which the regex engine scans for far faster than a leading alternation
+    return "|".join(f"(?<={re.escape(phrase)} RWY)" for phrase in sorted(phrases, key=len, reverse=True))
+
+
+# One scanner for every airport: the flow phrase, the first runway and any
+# runways listed after it
+FLOW_RE = re.compile(
+    rf"RWY(?:(?P<both>{_after(BOTH_PHRASES)})|(?P<dep>{_after(DEPARTURE_PHRASES)})|(?P<arr>{_after(ARRIVAL_PHRASES)}))S? "
+    rf"(?P<first>(?P<number>\d{{1,2}})[LRC]?(?!\d))"
+    rf"(?P<more>{RUNWAY_LIST})"
+)
+# Departure flow only: just the first runway after a DEPG style phrase
+DEPARTURE_RE = re.compile(rf"RWY(?:{_after(BOTH_PHRASES + DEPARTURE_PHRASES)})S? (\d{{1,2}})[LRC]?(?!\d)")
+
+
+def _flow_table(flow_config):
+    """
+    Runway number -> (priority, flow). Priority follows the order of
+    runway_flow.json, so the lowest one wins like the old nested loops did.
+    """
+    table = {}
+    for flow_direction, runways in flow_config.items():
+        for rwy in runways:
+            table.setdefault(rwy, (len(table), flow_direction.upper()))
+    return table
+
+
+FLOW_TABLES = {airport: _flow_table(config) for airport, config in RUNWAY_FLOW_MAP.items()}
+
+
+def detect_flow(airport_code, atis_text):
+    """
+    Departure and arrival flow plus the active runways from one scan of the
+    ATIS text. The flow of each kind comes from the first runway after a
+    DEPG/LDG style phrase, preferring runways listed earlier in
+    runway_flow.json. Returns None if the airport has no flow config.
+    """
+    table = FLOW_TABLES.get(airport_code.upper())
+    if table is None:
+        return None
+
+    departure = arrival = None
+    departure_runways, arrival_runways = [], []
+    for match in FLOW_RE.finditer(atis_text or ""):
+        both, dep, number, first, more = match.group("both", "dep", "number", "first", "more")
+        listed = [first] + RUNWAY_RE.findall(more) if more else [first]
+        flow = table.get(number)
+
+        # The phrase groups are empty lookbehinds, so test for None
+        if both is not None or dep is not None:
+            departure_runways += [rwy for rwy in listed if rwy not in departure_runways]
+            if flow and (departure is None or flow < departure):
+                departure = flow
+        if both is not None or dep is None:
+            arrival_runways += [rwy for rwy in listed if rwy not in arrival_runways]
+            if flow and (arrival is None or flow < arrival):
+                arrival = flow
+
+    return {
+        "departure": departure[1] if departure else None,
+        "arrival": arrival[1] if arrival else None,
+        "departure_runways": departure_runways,
+        "arrival_runways": arrival_runways
+    }
+
+
+def departure_flow(airport_code, atis_text):
+    """
+    detect_flow(...)["departure"] without the arrival side and runway lists,
+    for callers that only need the departure flow (route search).
+    """
+    table = FLOW_TABLES.get(airport_code.upper())
+    if table is None:
+        return None
+
+    departure = None
+    for number in DEPARTURE_RE.findall(atis_text or ""):
+        flow = table.get(number)
+        if flow and (departure is None or flow < departure):
+            departure = flow
+    return departure[1] if departure else None
+
+
+def fetch_datis(airport_code):
+    """D-ATIS entries for a (K-less) airport code, or None if the API has nothing."""
+    response = session.get(f"https://datis.clowd.io/api/K{airport_code.upper()}", timeout=5)
+    if response.status_code != 200:
+        return None
+    datis = response.json()
+    if not isinstance(datis, list) or len(datis) == 0:
+        return None
+    return datis
+
+
+def datis_text(datis):
+    """Text to detect the flow from: every ATIS the airport publishes (combined, or arrival and departure)."""
+    if not isinstance(datis, list):
+        return ""
+    return "\n".join(entry.get("datis", "") for entry in datis if isinstance(entry, dict))
+
+
+def format_atis(datis):
+    """ATIS text as shown in the airport info: combined, or departure and arrival."""
+    if datis[0]["type"] == "combined":
+        return datis[0]["datis"]
+    elif len(datis) > 1:
+        return f"Departure: {datis[1]['datis']}\nArrival: {datis[0]['datis']}"
+    return datis[0]["datis"]
@@ -0,0 +1,20 @@
+#shared HTTP session
+import requests
+from requests.adapters import HTTPAdapter
+from auxfns.metrics import time_response
+
+HTTP_POOL_SIZE = 16  # connections kept open per host
+
+
+def make_session(pool_size=HTTP_POOL_SIZE):
+    """requests.Session with a connection pool big enough for concurrent fetches, timed per host."""
+    session = requests.Session()
+    session.hooks["response"].append(time_response)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Reused for every outbound call (D-ATIS, METAR, VATSIM) so connections stay warm
+session = make_session()
@@ -0,0 +1,137 @@
+#index bootstrap and query plan audit for the ids collections
+import re
+import sys
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from auxfns.routeindex import ROUTE_INDEXES, origin_query
+from auxfns.procedures import RUNWAY_FILTER
+from models.db import (fixes_collection, navaids_collection, airway_collection, star_rte_collection,
+                       dp_rte_collection, routes_collection, faa_routes_collection, crossings_collection,
+                       enroute_collection)
+
+# Every index a request path relies on. Cache, lease and version documents are
+# read by _id and need nothing beyond the default index.
+INDEXES = {
+    **ROUTE_INDEXES,
+    fixes_collection: [[("FIX_ID", ASCENDING)]],
+    navaids_collection: [[("NAV_ID", ASCENDING)]],
+    airway_collection: [[("AWY_ID", ASCENDING)]],
+    # Equality on the code, then the POINT_SEQ sort straight from the index
+    star_rte_collection: [
+        [("TRANSITION_COMPUTER_CODE", ASCENDING), ("POINT_SEQ", DESCENDING)],
+        [("STAR_COMPUTER_CODE", ASCENDING), ("POINT_SEQ", DESCENDING)]
+    ],
+    dp_rte_collection: [
+        [("TRANSITION_COMPUTER_CODE", ASCENDING), ("POINT_SEQ", DESCENDING)],
+        [("SID_COMPUTER_CODE", ASCENDING), ("POINT_SEQ", DESCENDING)]
+    ],
+    crossings_collection: [[("destination", ASCENDING)]],
+    # /ids/enroute matches Field with an unanchored regex, which can only walk the
+    # whole index; still cheaper than fetching every document
+    enroute_collection: [[("Field", ASCENDING)]]
+}
+
+
+def ensure_indexes():
+    """Create every declared index; existing ones are left alone, so this can run on every deploy."""
+    ok = True
+    for collection, indexes in INDEXES.items():
+        for keys in indexes:
+            try:
+                name = collection.create_index(keys)
+                print(f"{collection.name}: {name}")
+            except OperationFailure as e:
+                # e.g. an index with the same keys but other options already exists
+                print(f"Error creating index {keys} on {collection.name}: {e}")
+                ok = False
+    return ok
+
+
+def _sample(collection, field, default):
+    """A real value of field, so explain() plans the query against actual data."""
+    doc = collection.find_one({field: {"$exists": True, "$nin": [None, ""]}}, {field: 1})
+    return doc[field] if doc else default
+
+
+def query_shapes():
+    """(name, collection, filter, sort) for every hot query, built the way the request paths build them."""
+    fix = _sample(fixes_collection, "FIX_ID", "DJB")
+    navaid = _sample(navaids_collection, "NAV_ID", "DJB")
+    star_transition = _sample(star_rte_collection, "TRANSITION_COMPUTER_CODE", "DJB.GRAYT3")
+    star = _sample(star_rte_collection, "STAR_COMPUTER_CODE", "GRAYT3")
+    sid_transition = _sample(dp_rte_collection, "TRANSITION_COMPUTER_CODE", "GRAYT3.DJB")
+    sid = _sample(dp_rte_collection, "SID_COMPUTER_CODE", "GRAYT3")
+    origin = _sample(faa_routes_collection, "Orig", "DTW")
+    destination = _sample(faa_routes_collection, "Dest", "CLE")
+    point_seq = [("POINT_SEQ", DESCENDING)]
+    not_transition = {"$not": re.compile(r'TRANSITION', re.IGNORECASE)}
+
+    return [
+        ("fix", fixes_collection, {"FIX_ID": {"$in": [fix]}}, None),
+        ("navaid", navaids_collection, {"NAV_ID": {"$in": [navaid]}}, None),
+        ("airway", airway_collection, {"AWY_ID": _sample(airway_collection, "AWY_ID", "J60")}, None),
+        ("star transition", star_rte_collection, {"TRANSITION_COMPUTER_CODE": star_transition, **RUNWAY_FILTER}, point_seq),
+        ("star", star_rte_collection, {"STAR_COMPUTER_CODE": star, "ROUTE_NAME": not_transition, **RUNWAY_FILTER}, point_seq),
+        ("sid transition", dp_rte_collection, {"TRANSITION_COMPUTER_CODE": sid_transition, **RUNWAY_FILTER}, point_seq),
+        ("sid", dp_rte_collection, {"SID_COMPUTER_CODE": sid, **RUNWAY_FILTER}, point_seq),
+        ("routes origin+destination", routes_collection,
+         {"$and": [origin_query(origin, "origin", "notes"), {"destination": destination}]}, None),
+        ("routes origin", routes_collection, origin_query(origin, "origin", "notes"), None),
+        ("routes destination", routes_collection, {"destination": destination}, None),
+        ("faa routes origin+destination", faa_routes_collection,
+         {"$and": [origin_query(origin, "Orig", "Area"), {"Dest": destination}]}, None),
+        ("faa routes origin", faa_routes_collection, origin_query(origin, "Orig", "Area"), None),
+        ("faa routes destination", faa_routes_collection, {"Dest": destination}, None),
+        ("crossings", crossings_collection, {"destination": destination}, [("destination", ASCENDING)]),
+        ("enroute", enroute_collection, {"Field": {"$regex": destination, "$options": "i"}}, None),
+    ]
+
+
+def plan_stages(plan):
+    """(stage, index name) for every stage of a winning plan, classic or slot-based."""
+    if isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+        return
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"], plan.get("indexName")
+    for key, value in plan.items():
+        if key != "slotBasedPlan" and isinstance(value, (dict, list)):
+            yield from plan_stages(value)
+
+
+def audit():
+    """
+    explain() every hot query and print its plan. Returns the names of the
+    queries that fell back to a collection scan.
+    """
+    scans = []
+    for name, collection, query, sort in query_shapes():
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        stages = list(plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        stats = explain.get("executionStats", {})
+        plan = " > ".join(f"{stage}({index})" if index else stage for stage, index in stages)
+        print(f"{name:30} {collection.name:15} {plan}  "
+              f"keys={stats.get('totalKeysExamined', '?')} docs={stats.get('totalDocsExamined', '?')} "
+              f"returned={stats.get('nReturned', '?')}")
+        if any(stage == "COLLSCAN" for stage, _ in stages):
+            scans.append(name)
+    return scans
+
+
+if __name__ == "__main__":
+    command = sys.argv[1:] or ["ensure", "audit"]
+    if not set(command) <= {"ensure", "audit"}:
+        sys.exit("usage: python -m auxfns.indexes [ensure] [audit]")
+    if "ensure" in command and not ensure_indexes():
+        sys.exit("Some indexes could not be created, see above")
+    if "audit" in command:
+        scans = audit()
+        if scans:
+            sys.exit(f"COLLSCAN in {len(scans)} hot queries: {', '.join(scans)}")
+        print("No collection scans")
@@ -0,0 +1,116 @@
+#cross-worker cache invalidation over MongoDB change streams
+import threading
+import time
+from pymongo.errors import PyMongoError
+from auxfns.metrics import register_gauge
+
+# Collections whose writes per-worker caches care about
+WATCHED_COLLECTIONS = [
+    "routes", "faa_prefroutes", "crossings", "enroute", "navdata_meta",
+    "aircraft_cache", "controller_cache", "atis_cache"
+]
+INVALIDATION_RETRY = 30          # seconds before reopening a failed stream
+INVALIDATION_SAFETY_INTERVAL = 60  # seconds between version polls while the stream is live
+
+# Only the fields handlers need, so a snapshot replace doesn't ship the whole document to every worker
+STREAM_PIPELINE = [
+    {"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}},
+    {"$project": {
+        "operationType": 1,
+        "ns": 1,
+        "documentKey": 1,
+        "fullDocument.version": 1,
+        "fullDocument.destination": 1,
+        "updateDescription.updatedFields.version": 1
+    }}
+]
+
+# collection -> [handler(event)]; handler(None) means "changes may have been
+# missed", e.g. after the stream (re)connects, so the cache should recheck
+_handlers = {}
+_last_change = {}
+_state = {"active": False, "thread": None, "resume_token": None}
+_lock = threading.Lock()
+
+
+def on_change(collections, handler):
+    """Call handler with each change event on these collections (registered at import by each cache)."""
+    for name in collections:
+        _handlers.setdefault(name, []).append(handler)
+
+
+def active():
+    """True while the change stream is open; caches then poll only as a safety net."""
+    return _state["active"]
+
+
+def poll_interval(interval):
+    """How often a cache should poll its version: as configured, or rarely while the stream is live."""
+    return max(interval, INVALIDATION_SAFETY_INTERVAL) if _state["active"] else interval
+
+
+def last_change(collection):
+    """Time of the last change event seen on a collection, or None."""
+    return _last_change.get(collection)
+
+
+def _dispatch(name, event):
+    for handler in _handlers.get(name, []):
+        try:
+            handler(event)
+        except Exception as e:
+            print(f"Error invalidating cache for {name}: {e}")
+
+
+def _resync():
+    for name in list(_handlers):
+        _dispatch(name, None)
+
+
+def _watch():
+    from models.db import db  # not at import: update_cache uses the snapshot helpers without the app's client
+    while True:
+        try:
+            with db.watch(STREAM_PIPELINE, resume_after=_state["resume_token"]) as stream:
+                _state["active"] = True
+                # Anything written while we weren't listening is only caught by a recheck
+                _resync()
+                print("Cache invalidation change stream open")
+                for event in stream:
+                    _state["resume_token"] = stream.resume_token
+                    name = event.get("ns", {}).get("coll")
+                    _last_change[name] = time.time()
+                    _dispatch(name, event)
+        except PyMongoError as e:
+            # Standalone servers have no change streams; version polling keeps working
+            print(f"Cache invalidation stream unavailable, polling versions instead: {e}")
+            if getattr(e, "code", None) == 286:  # ChangeStreamHistoryLost: the token fell off the oplog
+                _state["resume_token"] = None
+        except Exception as e:
+            print(f"Cache invalidation stream failed: {e}")
+        _state["active"] = False
+        time.sleep(INVALIDATION_RETRY)
+
+
+def start_invalidation_bus():
+    """Open this worker's change stream once, after gunicorn forks."""
+    if _state["thread"] is not None:
+        return
+    with _lock:
+        if _state["thread"] is None:
+            _state["thread"] = threading.Thread(target=_watch, name="invalidation-bus", daemon=True)
+            _state["thread"].start()
+
+
+register_gauge("ids_invalidation_stream_open", "1 while this worker's cache invalidation change stream is open",
+               lambda: int(_state["active"]))
+
+
+if __name__ == "__main__":
+    # python -m auxfns.invalidation: print change events, e.g. against a local replica set
+    from models.db import db
+    print(f"Watching {', '.join(WATCHED_COLLECTIONS)} (Ctrl-C to stop)")
+    with db.watch(STREAM_PIPELINE) as stream:
+        for event in stream:
+            print(event.get("operationType"), event.get("ns", {}).get("coll"), event.get("documentKey"),
+                  event.get("fullDocument") or event.get("updateDescription"))
@@ -0,0 +1,126 @@
+#leader election for the embedded cache refresher
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.db import leases
+from auxfns.metrics import register_gauge
+
+LEASE_NAME = "refresher"
+LEASE_TTL = 30        # seconds a lease lasts without a heartbeat
+LEASE_HEARTBEAT = 10  # seconds between renewals (and takeover attempts by followers)
+
+# holder: this process's id, made after gunicorn forks so every worker differs
+# stop: set to stop the update_cache scheduler while this process leads
+_state = {"holder": None, "thread": None, "stop": None, "gap_ms": None}
+_lock = threading.Lock()
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _record_takeover(holder, previous, now):
+    """Log and store how long the refresher was leaderless, as the failover latency."""
+    update = {"acquiredAt": now}
+    if previous and previous.get("holder"):
+        update["failover"] = {
+            "from": previous["holder"],
+            "to": holder,
+            "at": now,
+            # Last heartbeat of the old leader until this one took over
+            "gapMs": now - previous.get("renewedAt", now),
+            # Of which the lease was already expired for
+            "expiredMs": max(now - previous.get("expiresAt", now), 0)
+        }
+        _state["gap_ms"] = update["failover"]["gapMs"]
+        print(f"Took over the {LEASE_NAME} lease from {previous['holder']} "
+              f"{update['failover']['gapMs'] / 1000:.1f}s after its last heartbeat")
+    leases.update_one({"_id": LEASE_NAME, "holder": holder}, {"$set": update, "$inc": {"term": 1}})
+
+
+def try_acquire(holder):
+    """
+    Take the lease if it is free or expired, or renew it if we hold it.
+    Returns True while holder is the leader. A lease held by someone else
+    fails the filter, so the upsert collides on _id and we stay a follower.
+    """
+    now = _now_ms()
+    try:
+        previous = leases.find_one_and_update(
+            {"_id": LEASE_NAME, "$or": [{"holder": holder}, {"expiresAt": {"$lt": now}}]},
+            {"$set": {"holder": holder, "renewedAt": now, "expiresAt": now + LEASE_TTL * 1000}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        return False
+    if previous is None or previous.get("holder") != holder:
+        _record_takeover(holder, previous, now)
+    return True
+
+
+def release(holder):
+    """Expire our lease now, so a follower takes over on its next heartbeat instead of waiting LEASE_TTL."""
+    leases.update_one({"_id": LEASE_NAME, "holder": holder}, {"$set": {"expiresAt": 0}})
+
+
+def lease_status():
+    """The lease document: current holder, expiry, term and the last failover."""
+    return leases.find_one({"_id": LEASE_NAME}, {"_id": 0})
+
+
+def _lead(holder):
+    while True:
+        try:
+            leading = try_acquire(holder)
+        except Exception as e:
+            # Can't prove we still hold it: step down, the lease runs out on its own
+            print(f"Error renewing the {LEASE_NAME} lease: {e}")
+            leading = False
+
+        if leading and _state["stop"] is None:
+            import update_cache  # only the leader needs the refresh jobs and their connections
+            print(f"{holder} leads the cache refresher")
+            _state["stop"] = threading.Event()
+            update_cache.run_scheduler(_state["stop"])
+        elif not leading and _state["stop"] is not None:
+            print(f"{holder} lost the {LEASE_NAME} lease, stopping the cache refresher")
+            _state["stop"].set()
+            _state["stop"] = None
+        time.sleep(LEASE_HEARTBEAT)
+
+
+def _shutdown():
+    if _state["stop"] is not None:
+        _state["stop"].set()
+        try:
+            release(_state["holder"])
+        except Exception as e:
+            print(f"Error releasing the {LEASE_NAME} lease: {e}")
+
+
+def start_refresher():
+    """
+    Join the election for the embedded refresher, once per process. The
+    leader runs update_cache's scheduler; followers only serve the snapshots
+    it writes, which they notice through the version check.
+    """
+    if _state["thread"] is not None:
+        return
+    with _lock:
+        if _state["thread"] is None:
+            _state["holder"] = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            _state["thread"] = threading.Thread(target=_lead, args=(_state["holder"],), name="refresher-lease", daemon=True)
+            _state["thread"].start()
+            atexit.register(_shutdown)
+
+
+register_gauge("ids_refresher_leader", "1 while this worker runs the embedded cache refresher",
+               lambda: int(_state["stop"] is not None))
+register_gauge("ids_refresher_failover_gap_seconds", "Leaderless time before this worker's last takeover",
+               lambda: _state["gap_ms"] / 1000 if _state["gap_ms"] is not None else None)
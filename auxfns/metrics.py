@@ -0,0 +1,279 @@
+#per-endpoint request, Mongo and outbound HTTP metrics in Prometheus text format
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+from flask import has_request_context, request
+from pymongo import monitoring
+
+# Upper bounds in seconds, shared by requests, Mongo commands and outbound calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BACKGROUND = "background"  # endpoint label for work outside a request: refresher, watchers, startup
+
+# Each gunicorn worker writes its series to <METRICS_DIR>/<master pid>/<pid>.json
+# and a scrape, answered by any worker, adds up every file there. Workers that
+# exited keep their counts, so counters never go backwards between scrapes.
+METRICS_DIR = os.getenv("IDS_METRICS_DIR", os.path.join(tempfile.gettempdir(), "ids-metrics"))
+METRICS_FLUSH_INTERVAL = 5  # seconds; how far behind another worker's counts can be at a scrape
+
+# name -> (type, help)
+METRICS = {
+    "ids_request_seconds": ("histogram", "Flask request latency until the response is returned"),
+    "ids_mongo_command_seconds": ("histogram", "MongoDB command latency by endpoint, command and collection"),
+    "ids_mongo_commands_failed_total": ("counter", "MongoDB commands that returned an error"),
+    "ids_mongo_documents_returned_total": ("counter", "Documents MongoDB returned in cursor batches"),
+    "ids_http_client_seconds": ("histogram", "Outbound HTTP calls (D-ATIS, METAR, VATSIM) including the body download"),
+    "ids_stream_dropped_total": ("counter", "Stream subscribers dropped for falling behind"),
+}
+
+# name -> {label tuple -> series}; a histogram series is [bucket counts..., sum, count]
+_series = {}
+_gauges = {}  # name -> (description, fn returning a number)
+_lock = threading.Lock()
+_flusher = {"thread": None}
+
+
+def endpoint():
+    """Flask endpoint of the request this thread is serving, or BACKGROUND."""
+    if not has_request_context():
+        return BACKGROUND
+    return request.endpoint or "unmatched"
+
+
+def observe(name, labels, seconds):
+    """Add one latency observation to a histogram."""
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _series.setdefault(name, {})
+        counts = series.get(key)
+        if counts is None:
+            counts = series[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[-2] += seconds
+        counts[-1] += 1
+
+
+def inc(name, labels, amount=1):
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        series = _series.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+
+def register_gauge(name, description, fn):
+    """Report fn() as a gauge on every scrape (skipped while it returns None)."""
+    _gauges[name] = (description, fn)
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """
+    Attributes every command to the endpoint that issued it. pymongo calls
+    the listener on the thread running the command, so the request context
+    is still there.
+    """
+
+    def __init__(self):
+        # (request_id, connection) -> collection, since only the started event carries the command
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore carries the cursor id there and the collection separately
+            target = event.command.get("collection")
+        self._collections[(event.request_id, event.connection_id)] = target if isinstance(target, str) else ""
+
+    def _labels(self, event):
+        collection = self._collections.pop((event.request_id, event.connection_id), "")
+        return {"endpoint": endpoint(), "command": event.command_name, "collection": collection}
+
+    def succeeded(self, event):
+        labels = self._labels(event)
+        observe("ids_mongo_command_seconds", labels, event.duration_micros / 1e6)
+        cursor = event.reply.get("cursor")
+        if cursor:
+            returned = len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+            if returned:
+                inc("ids_mongo_documents_returned_total", labels, returned)
+
+    def failed(self, event):
+        labels = self._labels(event)
+        observe("ids_mongo_command_seconds", labels, event.duration_micros / 1e6)
+        inc("ids_mongo_commands_failed_total", labels)
+
+
+# Passed as event_listeners to every MongoClient
+command_timer = MongoCommandTimer()
+
+
+def time_response(response, *args, **kwargs):
+    """requests response hook: time an outbound call by host."""
+    started = time.perf_counter()
+    if not kwargs.get("stream"):
+        # requests reads the body right after the hooks anyway; do it here so it's timed
+        response.content
+    seconds = response.elapsed.total_seconds() + time.perf_counter() - started
+    observe("ids_http_client_seconds", {
+        "endpoint": endpoint(),
+        "host": urlparse(response.url).hostname or "",
+        "status": str(response.status_code)
+    }, seconds)
+
+
+def _run_dir():
+    # Workers share their master's pid; it changes on every restart, so counts start over
+    return os.path.join(METRICS_DIR, str(os.getppid()))
+
+
+def clear_run_dir():
+    """
+    Called at app import. Under gunicorn --preload that runs in the master,
+    whose pid names its workers' directory, so leftovers from an earlier
+    master with the same pid (pid 1 in a restarted container) are dropped.
+    """
+    for path in glob.glob(os.path.join(METRICS_DIR, str(os.getpid()), "*.json")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _local_series():
+    with _lock:
+        return {name: {key: list(v) if isinstance(v, list) else v for key, v in series.items()}
+                for name, series in _series.items()}
+
+
+def _gauge_values():
+    values = {}
+    for name, (description, fn) in _gauges.items():
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Error reading gauge {name}: {e}")
+            continue
+        if value is not None:
+            values[name] = value
+    return values
+
+
+def flush():
+    """Write this worker's series and gauges to its file, atomically."""
+    directory = _run_dir()
+    doc = {
+        "pid": os.getpid(),
+        "series": {name: [[list(key), value] for key, value in series.items()]
+                   for name, series in _local_series().items()},
+        "gauges": _gauge_values()
+    }
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(doc, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Error writing metrics to {directory}: {e}")
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def start_metrics_flusher():
+    """Start this worker's flush thread once, after gunicorn forks."""
+    if _flusher["thread"] is not None:
+        return
+    with _lock:
+        if _flusher["thread"] is None:
+            _flusher["thread"] = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher["thread"].start()
+            atexit.register(flush)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add(total, value):
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)] if total is not None else list(value)
+    return (total or 0) + value
+
+
+def _collect():
+    """Series summed over every worker's file, this one's taken live; gauges per live pid."""
+    merged = _local_series()
+    gauges = [(name, os.getpid(), value) for name, value in _gauge_values().items()]
+    for path in glob.glob(os.path.join(_run_dir(), "*.json")):
+        try:
+            with open(path, "r") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if doc.get("pid") == os.getpid():
+            continue
+        for name, entries in doc.get("series", {}).items():
+            series = merged.setdefault(name, {})
+            for pairs, value in entries:
+                key = tuple(tuple(pair) for pair in pairs)
+                series[key] = _add(series.get(key), value)
+        # A gauge is a worker's current state, meaningless once it is gone
+        if _alive(doc.get("pid")):
+            gauges.extend((name, doc["pid"], value) for name, value in doc.get("gauges", {}).items())
+    return merged, gauges
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels_text(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render():
+    """Every metric, summed over all workers, in the Prometheus text exposition format."""
+    snapshot, gauges = _collect()
+
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(snapshot.get(name, {}).items()):
+            if kind == "histogram":
+                for bound, count in zip(LATENCY_BUCKETS, value):
+                    lines.append(f"{name}_bucket{_labels_text(key, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_labels_text(key, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_labels_text(key)} {value[-2]:.6f}")
+                lines.append(f"{name}_count{_labels_text(key)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_labels_text(key)} {value}")
+
+    # Gauges stay per worker, labelled with its pid
+    for name, (description, _) in _gauges.items():
+        values = sorted((pid, value) for gauge, pid, value in gauges if gauge == name)
+        if not values:
+            continue
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for pid, value in values:
+            lines.append(f"{name}{_labels_text([('pid', pid)])} {value}")
+    return "\n".join(lines) + "\n"
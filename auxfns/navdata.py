@@ -0,0 +1,317 @@
+#fix, navaid and airway lookups
+import hashlib
+import re
+import sys
+import threading
+import time
+from pymongo import MongoClient, DESCENDING
+from auxfns.invalidation import on_change
+from models.db import (MONGO_URI, fixes_collection, navaids_collection, airway_collection, navdata_meta,
+                       star_rte_collection, dp_rte_collection)
+
+COORD_PROJECTION = {"_id": 0, "LAT_DECIMAL": 1, "LONG_DECIMAL": 1}
+NAVDATA_VERSION_CHECK_INTERVAL = 300  # seconds between checks of the AIRAC cycle marker
+
+# In-process copy of the NASR reference data. Replaced as a whole on reload so
+# readers never see a half-built index.
+#   coords:   identifier -> (lat, lon), fixes taking precedence over navaids
+#   airways:  AWY_ID -> tuple of fix identifiers in airway order
+#   positions: AWY_ID -> {fix: index of its first occurrence}
+#   stars/sids: {"transitions": TRANSITION_COMPUTER_CODE -> waypoints,
+#                "procedures": STAR/SID_COMPUTER_CODE -> waypoints}
+_index = None
+_checked_at = 0
+_reloading = False
+_lock = threading.Lock()
+
+
+# Collections the index is built from
+NAVDATA_COLLECTIONS = (fixes_collection, navaids_collection, airway_collection, star_rte_collection, dp_rte_collection)
+
+
+def _current_cycle(db=None):
+    """
+    The cycle in the navdata_meta marker (python -m auxfns.navdata bump-cycle
+    after each NASR import). Without a marker, a digest of every navdata
+    collection's count and newest _id, which changes when an import inserts.
+    """
+    meta = db[navdata_meta.name] if db is not None else navdata_meta
+    doc = meta.find_one({"_id": "nasr"}, {"cycle": 1})
+    if doc and doc.get("cycle"):
+        return doc["cycle"]
+
+    signal = []
+    for collection in NAVDATA_COLLECTIONS:
+        if db is not None:
+            collection = db[collection.name]
+        newest = collection.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+        signal.append(f"{collection.estimated_document_count()}:{newest['_id'] if newest else ''}")
+    return "unmarked-" + hashlib.sha1(",".join(signal).encode()).hexdigest()[:12]
+
+
+def bump_cycle(cycle=None):
+    """Write the cycle marker, so every worker reloads the index. Defaults to the current UTC time."""
+    cycle = cycle or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    navdata_meta.update_one({"_id": "nasr"}, {"$set": {"cycle": cycle, "updatedAt": time.time()}}, upsert=True)
+    return cycle
+
+
+def _has_coords(doc):
+    return doc is not None and doc.get("LAT_DECIMAL") is not None and doc.get("LONG_DECIMAL") is not None
+
+
+PROCEDURE_PROJECTION = {"_id": 0, "POINT": 1, "POINT_SEQ": 1, "ARPT_RWY_ASSOC": 1,
+                        "TRANSITION_COMPUTER_CODE": 1, "ROUTE_NAME": 1}
+TRANSITION_NAME_RE = re.compile(r'TRANSITION', re.IGNORECASE)
+
+
+def _all_runways(doc):
+    """True for rows the runway filter keeps: no runway-specific ARPT_RWY_ASSOC ("04L/04R")."""
+    assoc = doc.get("ARPT_RWY_ASSOC")
+    if isinstance(assoc, list):
+        return not any(isinstance(a, str) and '/' in a for a in assoc)
+    return not (isinstance(assoc, str) and '/' in assoc)
+
+
+def _seq_key(doc):
+    # Same order as a Mongo sort on POINT_SEQ: missing/null, then numbers, then strings
+    seq = doc.get("POINT_SEQ")
+    if seq is None:
+        return (0, 0)
+    if isinstance(seq, (int, float)):
+        return (1, seq)
+    return (2, str(seq))
+
+
+def _procedure_table(collection, code_field, skip_transition_routes):
+    """
+    Code -> waypoints for every transition and procedure in one collection,
+    built the way the per-request queries did: runway filter, POINT_SEQ
+    descending, each point once.
+    """
+    rows = {"transitions": {}, "procedures": {}}
+    for doc in collection.find({}, {**PROCEDURE_PROJECTION, code_field: 1}):
+        if not _all_runways(doc):
+            continue
+        code = doc.get("TRANSITION_COMPUTER_CODE")
+        if code:
+            rows["transitions"].setdefault(code, []).append(doc)
+        code = doc.get(code_field)
+        name = doc.get("ROUTE_NAME")
+        if skip_transition_routes and isinstance(name, str) and TRANSITION_NAME_RE.search(name):
+            continue
+        if code:
+            rows["procedures"].setdefault(code, []).append(doc)
+
+    table = {}
+    for kind, by_code in rows.items():
+        table[kind] = {}
+        for code, docs in by_code.items():
+            docs.sort(key=_seq_key, reverse=True)
+            points = dict.fromkeys(sys.intern(d["POINT"]) for d in docs if d.get("POINT"))
+            table[kind][code] = tuple(points)
+    return table
+
+
+def _build_index():
+    # A client of its own, closed when the build is done: with --preload this
+    # runs in the gunicorn master, and forked workers must not inherit its pool
+    with MongoClient(MONGO_URI) as client:
+        return _build_index_from(client[fixes_collection.database.name])
+
+
+def _build_index_from(db):
+    cycle = _current_cycle(db)
+
+    coords = {}
+    seen = set()
+    for doc in db[fixes_collection.name].find({}, {**COORD_PROJECTION, "FIX_ID": 1}):
+        ident = doc.get("FIX_ID")
+        if not ident or ident in seen:
+            continue
+        seen.add(ident)
+        if _has_coords(doc):
+            coords[sys.intern(ident)] = (doc["LAT_DECIMAL"], doc["LONG_DECIMAL"])
+
+    seen = set()
+    for doc in db[navaids_collection.name].find({}, {**COORD_PROJECTION, "NAV_ID": 1}):
+        ident = doc.get("NAV_ID")
+        if not ident or ident in coords or ident in seen:
+            continue
+        seen.add(ident)
+        if _has_coords(doc):
+            coords[sys.intern(ident)] = (doc["LAT_DECIMAL"], doc["LONG_DECIMAL"])
+
+    airways = {}
+    positions = {}
+    for doc in db[airway_collection.name].find({}, {"_id": 0, "AWY_ID": 1, "AIRWAY_STRING": 1}):
+        awy_id = doc.get("AWY_ID")
+        if not awy_id or awy_id in airways:
+            continue
+        fixes = tuple(sys.intern(f) for f in doc.get("AIRWAY_STRING", "").split())
+        position = {}
+        for i, fix in enumerate(fixes):
+            position.setdefault(fix, i)
+        airways[awy_id] = fixes
+        positions[awy_id] = position
+
+    return {
+        "cycle": cycle,
+        "coords": coords,
+        "airways": airways,
+        "positions": positions,
+        "stars": _procedure_table(db[star_rte_collection.name], "STAR_COMPUTER_CODE", True),
+        "sids": _procedure_table(db[dp_rte_collection.name], "SID_COMPUTER_CODE", False)
+    }
+
+
+def load_navdata():
+    """
+    Build the in-memory navdata index. Called once at startup, before gunicorn
+    forks when the app is preloaded, so workers share the pages copy-on-write.
+    Returns False (and leaves lookups on Mongo) if the build fails.
+    """
+    global _index, _checked_at
+    try:
+        started = time.time()
+        index = _build_index()
+    except Exception as e:
+        print(f"Error loading navdata index: {e}")
+        return False
+
+    _index = index
+    _checked_at = time.time()
+    print(f"Navdata index loaded for cycle {index['cycle']}: {len(index['coords'])} points, "
+          f"{len(index['airways'])} airways, {len(index['stars']['procedures'])} STARs, "
+          f"{len(index['sids']['procedures'])} SIDs in {_checked_at - started:.1f}s")
+    return True
+
+
+def _reload_in_background():
+    global _reloading
+    try:
+        load_navdata()
+    finally:
+        _reloading = False
+
+
+def _navdata():
+    """
+    Current index, or None if it isn't available. Checks the cycle marker at
+    most once per NAVDATA_VERSION_CHECK_INTERVAL and rebuilds in the background,
+    serving the previous cycle until the new one is ready.
+    """
+    global _checked_at, _reloading
+    index = _index
+    now = time.time()
+    if now - _checked_at < NAVDATA_VERSION_CHECK_INTERVAL:
+        return index
+
+    with _lock:
+        if _reloading or now - _checked_at < NAVDATA_VERSION_CHECK_INTERVAL:
+            return index
+        _checked_at = now
+        try:
+            stale = index is None or _current_cycle() != index["cycle"]
+        except Exception as e:
+            print(f"Error checking navdata cycle: {e}")
+            stale = False
+        if stale:
+            _reloading = True
+            threading.Thread(target=_reload_in_background, daemon=True).start()
+    return index
+
+
+def _first_by_id(collection, id_field, ids):
+    """One $in query; keeps the first document per identifier, like find_one would."""
+    docs = {}
+    projection = {**COORD_PROJECTION, id_field: 1}
+    for doc in collection.find({id_field: {"$in": ids}}, projection):
+        docs.setdefault(doc.get(id_field), doc)
+    return docs
+
+
+def _resolve_fixes_from_db(ids):
+    fix_docs = _first_by_id(fixes_collection, "FIX_ID", ids)
+    missing = [i for i in ids if not _has_coords(fix_docs.get(i))]
+    nav_docs = _first_by_id(navaids_collection, "NAV_ID", missing) if missing else {}
+
+    results = {}
+    for ident in ids:
+        doc = fix_docs.get(ident)
+        if not _has_coords(doc):
+            doc = nav_docs.get(ident)
+        if _has_coords(doc):
+            results[ident] = {
+                'lat': doc['LAT_DECIMAL'],
+                'lon': doc['LONG_DECIMAL']
+            }
+    return results
+
+
+def resolve_fixes(fix_list):
+    """
+    Resolve identifiers to {'lat', 'lon'}, from the in-memory index when it is
+    loaded and otherwise with one query per collection. A fix takes precedence
+    over a navaid with the same identifier, and the result is keyed in the
+    order the identifiers were requested.
+    """
+    ids = list(dict.fromkeys(fix_list))
+    if not ids:
+        return {}
+
+    index = _navdata()
+    if index is None:
+        return _resolve_fixes_from_db(ids)
+
+    coords = index["coords"]
+    results = {}
+    for ident in ids:
+        point = coords.get(ident)
+        if point is not None:
+            results[ident] = {'lat': point[0], 'lon': point[1]}
+    return results
+
+
+def get_airway(airway_id):
+    """
+    Returns (fixes, positions) for an airway, or None if it doesn't exist.
+    positions maps each fix to the index of its first occurrence.
+    """
+    index = _navdata()
+    if index is not None:
+        fixes = index["airways"].get(airway_id)
+        if fixes is None:
+            return None
+        return fixes, index["positions"][airway_id]
+
+    airway_doc = airway_collection.find_one({'AWY_ID': airway_id})
+    if not airway_doc:
+        return None
+    fixes = tuple(airway_doc['AIRWAY_STRING'].split())
+    positions = {}
+    for i, fix in enumerate(fixes):
+        positions.setdefault(fix, i)
+    return fixes, positions
+
+
+def procedure_table(kind):
+    """The 'stars' or 'sids' waypoint table, or None if the index isn't loaded."""
+    index = _navdata()
+    return index[kind] if index is not None else None
+
+
+def _on_cycle_change(event):
+    # A new cycle marker was written: check it on the next lookup instead of waiting out the interval
+    global _checked_at
+    _checked_at = 0
+
+
+on_change(["navdata_meta"], _on_cycle_change)
+
+
+if __name__ == "__main__":
+    # Run after every NASR import: python -m auxfns.navdata bump-cycle [CYCLE]
+    if sys.argv[1:2] != ["bump-cycle"] or len(sys.argv) > 3:
+        sys.exit("usage: python -m auxfns.navdata bump-cycle [CYCLE]")
+    print(f"navdata_meta cycle set to {bump_cycle(sys.argv[2] if len(sys.argv) > 2 else None)}")
@@ -0,0 +1,98 @@
+#SID/STAR transition lookups
+import re
+from pymongo import DESCENDING
+from models.db import star_rte_collection, dp_rte_collection
+from auxfns.navdata import procedure_table
+
+# Shared ARPT_RWY_ASSOC filter
+RUNWAY_FILTER = {
+    '$or': [
+        {'ARPT_RWY_ASSOC': {'$exists': False}},
+        {'ARPT_RWY_ASSOC': ''},
+        {'ARPT_RWY_ASSOC': {'$not': re.compile(r'/')}}
+    ]
+}
+
+
+def _unique_points(rows):
+    return list(dict.fromkeys(doc['POINT'] for doc in rows if doc.get('POINT')))
+
+
+def _from_table(table, code):
+    """Transition code first, then the procedure code, like the two queries below."""
+    waypoints = table["transitions"].get(code)
+    if waypoints is None:
+        waypoints = table["procedures"].get(code, ())
+    return list(waypoints)
+
+
+def _star_from_db(code):
+    # First try: search by TRANSITION_COMPUTER_CODE
+    rte_cursor = list(star_rte_collection.find({
+        'TRANSITION_COMPUTER_CODE': code,
+        **RUNWAY_FILTER
+    }).sort('POINT_SEQ', DESCENDING))
+
+    if not rte_cursor:
+        rte_cursor = list(star_rte_collection.find({
+            'STAR_COMPUTER_CODE': code,
+            'ROUTE_NAME': {'$not': re.compile(r'TRANSITION', re.IGNORECASE)},
+            **RUNWAY_FILTER
+        }).sort('POINT_SEQ', DESCENDING))
+
+    return _unique_points(rte_cursor)
+
+
+def _sid_from_db(code):
+    # First try: search by TRANSITION_COMPUTER_CODE
+    rte_cursor = list(dp_rte_collection.find({
+        'TRANSITION_COMPUTER_CODE': code,
+        **RUNWAY_FILTER
+    }).sort('POINT_SEQ', DESCENDING))  # Note: ASCENDING for SIDs
+
+    # Fallback: search by SID_COMPUTER_CODE if nothing found
+    if not rte_cursor:
+        rte_cursor = list(dp_rte_collection.find({
+            'SID_COMPUTER_CODE': code,
+            **RUNWAY_FILTER
+        }).sort('POINT_SEQ', DESCENDING))
+
+    return _unique_points(rte_cursor)
+
+
+def star_waypoints(code, fallback=True):
+    """
+    Waypoints for a STAR transition (or STAR) computer code, or None if
+    nothing is found. With fallback, a dotted code that matches nothing
+    returns the part after the dot. Served from the navdata index, or from
+    Mongo while it isn't loaded.
+    """
+    table = procedure_table("stars")
+    waypoints = _from_table(table, code) if table is not None else _star_from_db(code)
+    if waypoints:
+        return waypoints
+
+    # Fallback for STAR: return part after the dot if code contains dot
+    if fallback and '.' in code:
+        _, after_dot = code.split('.', 1)
+        return [after_dot]
+    return None
+
+
+def sid_waypoints(code, fallback=True):
+    """
+    Waypoints for a SID transition (or SID) computer code, or None if
+    nothing is found. With fallback, a dotted code that matches nothing
+    returns the part before the dot without its version number. Served from
+    the navdata index, or from Mongo while it isn't loaded.
+    """
+    table = procedure_table("sids")
+    waypoints = _from_table(table, code) if table is not None else _sid_from_db(code)
+    if waypoints:
+        return waypoints
+
+    # Fallback for SID: return part before the dot if code contains dot
+    if fallback and '.' in code:
+        before_dot = code.split('.', 1)[0]
+        return [before_dot[:-1]]
+    return None
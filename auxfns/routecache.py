@@ -0,0 +1,105 @@
+#route search result cache
+import threading
+import time
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from models.db import cache_versions
+from auxfns.invalidation import on_change, poll_interval
+
+ROUTE_CACHE_SIZE = 512              # (origin, destination) pairs kept per worker
+ROUTE_CACHE_TTL = 600               # seconds, an upper bound on staleness
+ROUTE_VERSION_CHECK_INTERVAL = 2    # seconds between checks for writes by other workers
+
+# (origin, destination) -> (merged routes, cached_at), least recently used first
+_results = OrderedDict()
+_lock = threading.Lock()
+# Last routes version this worker has seen in cache_versions; generation goes
+# up on every invalidation, so a result computed across one isn't stored
+_state = {"version": None, "checked_at": 0, "generation": 0}
+
+
+def _routes_version():
+    doc = cache_versions.find_one({"_id": "routes"}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+def _check_version():
+    """Drop everything if another worker (or an import) has written routes since the last check."""
+    now = time.time()
+    if now - _state["checked_at"] < poll_interval(ROUTE_VERSION_CHECK_INTERVAL):
+        return
+    _state["checked_at"] = now
+    try:
+        version = _routes_version()
+    except Exception as e:
+        print(f"Error checking routes version: {e}")
+        return
+    if version != _state["version"]:
+        with _lock:
+            _results.clear()
+            _state["generation"] += 1
+        _state["version"] = version
+
+
+def get_routes(key, compute):
+    """Cached merged routes for an (origin, destination) pair, computed on a miss."""
+    _check_version()
+    now = time.time()
+    with _lock:
+        entry = _results.get(key)
+        if entry and now - entry[1] < ROUTE_CACHE_TTL:
+            _results.move_to_end(key)
+            return entry[0]
+        generation = _state["generation"]
+
+    routes = compute()
+    with _lock:
+        if _state["generation"] != generation:
+            # Routes were written while this was computed: it may predate the write
+            return routes
+        _results[key] = (routes, now)
+        _results.move_to_end(key)
+        while len(_results) > ROUTE_CACHE_SIZE:
+            _results.popitem(last=False)
+    return routes
+
+
+def invalidate_routes(*destinations):
+    """
+    Called after a route write. Drops this worker's entries for the affected
+    destinations, plus those without a destination (an origin-only search can
+    match any route through its notes), and bumps the shared version so
+    other workers clear theirs.
+    """
+    affected = {str(d or '').upper() for d in destinations} | {''}
+    with _lock:
+        for key in [k for k in _results if k[1] in affected]:
+            del _results[key]
+        _state["generation"] += 1
+
+    try:
+        doc = cache_versions.find_one_and_update(
+            {"_id": "routes"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        print(f"Error bumping routes version: {e}")
+        return
+    # Only skip the next clear if nobody else wrote in between
+    if _state["version"] is not None and doc["version"] == _state["version"] + 1:
+        _state["version"] = doc["version"]
+
+
+def _on_routes_change(event):
+    # A route was written somewhere (this worker, another one, or an import); writes
+    # are rare admin actions, so drop everything rather than work out which pairs
+    with _lock:
+        _results.clear()
+        _state["generation"] += 1
+    if event is None:
+        _state["checked_at"] = 0
+
+
+on_change(["routes", "faa_prefroutes"], _on_routes_change)
@@ -0,0 +1,135 @@
+#route search index and precomputed route fields
+import re
+import sys
+from pymongo import ASCENDING, UpdateOne
+from auxfns.routecache import invalidate_routes
+from models.db import routes_collection, faa_routes_collection
+
+# Origins are matched against every substring of every word in the notes
+# (custom routes) or Area (FAA routes). Storing those substrings as an array
+# turns the old unanchored, case-insensitive $regex into an exact match on a
+# multikey index. Origins outside these lengths use the regex instead.
+MIN_TOKEN_LEN = 3
+MAX_TOKEN_LEN = 5
+WORD_RE = re.compile(r'[A-Z0-9]+')
+
+ROUTE_INDEXES = {
+    routes_collection: [
+        [("searchTokens", ASCENDING), ("destination", ASCENDING)],
+        [("destination", ASCENDING)]
+    ],
+    faa_routes_collection: [
+        [("searchTokens", ASCENDING), ("Dest", ASCENDING)],
+        [("Dest", ASCENDING)]
+    ]
+}
+
+
+def normalize(text):
+    try:
+        return ' '.join(str(text).strip().upper().split())
+    except Exception:
+        return ''
+
+
+def search_tokens(origin, text):
+    """
+    Tokens an origin query can match: the stored origin exactly as written,
+    plus every MIN_TOKEN_LEN..MAX_TOKEN_LEN character substring of each
+    word of text, uppercased.
+    """
+    tokens = set()
+    if isinstance(origin, str) and origin:
+        tokens.add(origin)
+    for word in WORD_RE.findall(str(text or '').upper()):
+        for size in range(MIN_TOKEN_LEN, min(len(word), MAX_TOKEN_LEN) + 1):
+            for start in range(len(word) - size + 1):
+                tokens.add(word[start:start + size])
+    return sorted(tokens)
+
+
+def is_indexable(origin):
+    return MIN_TOKEN_LEN <= len(origin) <= MAX_TOKEN_LEN and WORD_RE.fullmatch(origin) is not None
+
+
+def origin_query(origin, origin_field, text_field):
+    """
+    Match origin the way the old {origin_field: origin} / {text_field: $regex}
+    pair did. Documents that predate the index (no searchTokens) still go
+    through the regex, reached through the index's null entries.
+    """
+    legacy = {"$or": [
+        {origin_field: origin},
+        {text_field: {"$regex": origin, "$options": "i"}}
+    ]}
+    if not is_indexable(origin):
+        return legacy
+    return {"$or": [
+        {"searchTokens": origin},
+        {"searchTokens": None, **legacy}
+    ]}
+
+
+def route_fields(doc):
+    """
+    Fields derived from a custom route, stored with it on every write so
+    searchroute doesn't recompute them per request: search tokens, the
+    (origin, destination, normalized route) dedupe key, uppercased notes
+    for flow matching and the event flag.
+    """
+    notes_upper = str(doc.get("notes") or "").upper()
+    return {
+        "searchTokens": search_tokens(doc.get("origin"), doc.get("notes")),
+        "dedupeKey": [
+            str(doc.get("origin") or "").upper(),
+            str(doc.get("destination") or "").upper(),
+            normalize(doc.get("route", ""))
+        ],
+        "notesUpper": notes_upper,
+        "isEvent": 'EVENT' in notes_upper
+    }
+
+
+def faa_fields(doc):
+    """Fields derived from an FAA preferred route, stored with it at import."""
+    direction = doc.get("Direction", "")
+    notes = [doc.get("Area", ""), direction, doc.get("Aircraft", "")]
+    return {
+        "searchTokens": search_tokens(doc.get("Orig"), doc.get("Area")),
+        "routeNorm": normalize(doc.get("RouteString", "")),
+        "notesText": ', '.join(filter(None, notes)),
+        "directionUpper": str(direction or "").upper()
+    }
+
+
+def ensure_route_indexes():
+    for collection, indexes in ROUTE_INDEXES.items():
+        for keys in indexes:
+            collection.create_index(keys)
+
+
+def backfill(batch_size=1000):
+    """Recompute the derived fields of every route; run after each FAA import."""
+    ensure_route_indexes()
+    for collection, fields_for in ((routes_collection, route_fields),
+                                   (faa_routes_collection, faa_fields)):
+        ops = []
+        count = 0
+        for doc in collection.find({}):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields_for(doc)}))
+            if len(ops) >= batch_size:
+                collection.bulk_write(ops, ordered=False)
+                count += len(ops)
+                ops = []
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+            count += len(ops)
+        print(f"Backfilled {count} documents in {collection.name}")
+    # Every worker drops its cached search results
+    invalidate_routes()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] not in ([], ["backfill"]):
+        sys.exit("usage: python -m auxfns.routeindex [backfill]")
+    backfill()
@@ -1,118 +1,74 @@
-import os
-from flask import json
-from auxfns.wxflow import get_flow
-from pymongo import MongoClient, DESCENDING
+from auxfns.flowdetect import RUNWAY_FLOW_MAP
+from auxfns.flowcache import get_cached_flow
+from auxfns.routeindex import origin_query, route_fields, faa_fields
+from auxfns.routecache import get_routes
+from models.db import routes_collection, faa_routes_collection
 from collections import OrderedDict
 
-from dotenv import load_dotenv
-load_dotenv()
-
-MONGO_URI = os.getenv("MONGO_URI")
-
-with open ("data/runway_flow.json", "r") as f:
-    RUNWAY_FLOW_MAP = json.load(f)
-
-client = MongoClient(MONGO_URI)
-
-db = client["ids"]
-routes_collection = db["routes"]
-crossings_collection = db["crossings"]
-faa_routes_collection = db["faa_prefroutes"]
-fixes_collection = db["fixes"]
-navaids_collection = db["navaids"]
-airway_collection = db["airways"]
-star_rte_collection = db["star_rte"]
-dp_rte_collection = db["sid_rte"]
-enroute_collection = db["enroute"]
-
-def normalize(text):
-    try:
-        return ' '.join(str(text).strip().upper().split())
-    except Exception:
-        return ''
-
-def searchroute(origin, destination):
-    if len(origin) == 4 and origin.startswith('K'):
-        origin = origin[1:]
-    elif len(origin) == 4 and origin.startswith('C'):
-        origin = origin[1:]
-    if len(destination) == 4 and destination.startswith('K'):
-        destination = destination[1:]
-    elif len(destination) == 4 and destination.startswith('C'): 
-        destination = destination[1:]
-
+# The token array is only needed by the query itself
+ROUTE_PROJECTION = {"searchTokens": 0}
+
+def strip_prefix(code):
+    if len(code) == 4 and code.startswith('K'):
+        return code[1:]
+    elif len(code) == 4 and code.startswith('C'):
+        return code[1:]
+    return code
+
+def merge_routes(origin, destination):
+    """
+    Custom and FAA routes for a pair, deduplicated, without the flow-dependent
+    fields. Each route carries the text its flow is matched against in
+    '_flowText'. Only depends on route data, so it is cached per pair.
+    """
     query = {}
     if origin and destination:
         query = {
             "$and": [
-                {"$or": [
-                    {"origin": origin},
-                    {"notes": {"$regex": origin, "$options": "i"}}
-                ]},
+                origin_query(origin, "origin", "notes"),
                 {"destination": destination}
             ]
         }
     elif origin:
-        query = {"$or": [
-            {"origin": origin},
-            {"notes": {"$regex": origin, "$options": "i"}}
-        ]}
+        query = origin_query(origin, "origin", "notes")
     elif destination:
         query = {"destination": destination}
 
     # If both origin and destination are not provided, return only custom routes
     if not origin and not destination:
-        custom_matches = list(routes_collection.find({}))
+        custom_matches = list(routes_collection.find({}, ROUTE_PROJECTION))
         faa_matches = []  # Skip FAA routes
     else:
         # Step 1: Fetch all matches
-        custom_matches = list(routes_collection.find(query))
+        custom_matches = list(routes_collection.find(query, ROUTE_PROJECTION))
 
         # FAA query
         faa_query = {}
         if origin and destination:
             faa_query = {
                 "$and": [
-                    {"$or": [
-                        {"Orig": origin},
-                        {"Area": {"$regex": origin, "$options": "i"}}
-                    ]},
+                    origin_query(origin, "Orig", "Area"),
                     {"Dest": destination}
                 ]
             }
         elif origin:
-            faa_query = {
-                "$or": [
-                    {"Orig": origin},
-                    {"Area": {"$regex": origin, "$options": "i"}}
-                ]
-            }
+            faa_query = origin_query(origin, "Orig", "Area")
         elif destination:
             faa_query = {"Dest": destination}
 
-        faa_matches = list(faa_routes_collection.find(faa_query))
+        faa_matches = list(faa_routes_collection.find(faa_query, ROUTE_PROJECTION))
 
     # Step 2: Prepare deduplication dictionary
     routes_dict = OrderedDict()
+    hasFlows = destination in RUNWAY_FLOW_MAP
 
     # Step 3: Insert custom routes first
     for row in custom_matches:
-        route_string = normalize(row.get("route", ""))
-        route_origin = row.get("origin", "").upper()
-        route_destination = row.get("destination", "").upper()
-        route_notes = row.get("notes", "")
-        key = (route_origin, route_destination, route_string)
-
-        CurrFlow = ''
-        isActive = False
-        hasFlows = False
-        eventRoute = 'EVENT' in route_notes.upper()
-
-        if destination in RUNWAY_FLOW_MAP:
-            hasFlows = True
-            CurrFlow = get_flow(destination)
-            if CurrFlow and CurrFlow.upper() in route_notes.upper():
-                isActive = True
+        if "dedupeKey" not in row:
+            # Written before derived fields were stored
+            row.update(route_fields(row))
+        key = tuple(row["dedupeKey"])
+        route_origin, route_destination, route_string = key
 
         routes_dict[key] = {
             '_id': str(row['_id']),  # Add ID
@@ -120,39 +76,24 @@ def searchroute(origin, destination):
             'destination': route_destination,
             'route': route_string,
             'altitude': row.get("altitude", ""),
-            'notes': route_notes,
-            'flow': CurrFlow or '',
-            'isActive': isActive,
+            'notes': row.get("notes", ""),
             'hasFlows': hasFlows,
             'source': 'custom',
-            'isEvent': eventRoute
+            'isEvent': row["isEvent"],
+            '_flowText': row["notesUpper"]
         }
 
-    print(routes_dict)
-
     # Step 4: Overwrite duplicates with FAA routes (only if origin and destination are provided)
     if origin or destination:
+        route_origin = origin.upper()
+        route_destination = destination.upper()
         for row in faa_matches:
-            route_string = normalize(row.get("RouteString", ""))
-            route_origin = origin.upper()
-            route_destination = destination.upper()
+            if "routeNorm" not in row:
+                # Imported before derived fields were stored
+                row.update(faa_fields(row))
+            route_string = row["routeNorm"]
             key = (route_origin, route_destination, route_string)
 
-            isActive = False
-            hasFlows = False
-            flow = ''
-            direction = row.get("Direction", "")
-
-            if direction and destination in RUNWAY_FLOW_MAP:
-                hasFlows = True
-                flow = get_flow(destination)
-                if flow and flow.upper() in direction.upper():
-                    isActive = True
-            
-            fields = [row.get("Area", ""), row.get("Direction", ""), row.get("Aircraft", "")]
-            notes = ', '.join(filter(None, fields))
-
-
             # Check if custom route already exists for this key
             custom_altitude = ''
             if key in routes_dict and routes_dict[key]['source'] == 'custom':
@@ -163,14 +104,39 @@ def searchroute(origin, destination):
                 'destination': route_destination,
                 'route': route_string,
                 'altitude': custom_altitude,  # retain custom altitude if present
-                'notes': notes,
-                'flow': flow,
-                'isActive': isActive,
-                'hasFlows': hasFlows,
+                'notes': row["notesText"],
+                'hasFlows': bool(row["directionUpper"]) and hasFlows,
                 'source': 'faa',
-                'isEvent': False
+                'isEvent': False,
+                '_flowText': row["directionUpper"]
             }
 
+    return list(routes_dict.values())
+
+def searchroute(origin, destination):
+    origin = strip_prefix(origin)
+    destination = strip_prefix(destination)
+
+    merged = get_routes((origin, destination), lambda: merge_routes(origin, destination))
+
+    # Flow only depends on the destination, resolve it once for every row
+    CurrFlow = ''
+    if destination in RUNWAY_FLOW_MAP:
+        CurrFlow = get_cached_flow(destination) or ''
+
+    # Overlay the current flow on the cached routes
+    routes = []
+    for cached in merged:
+        flow = CurrFlow if cached['hasFlows'] else ''
+        route = {}
+        for field, value in cached.items():
+            if field == 'hasFlows':
+                route['flow'] = flow
+                route['isActive'] = bool(flow) and flow.upper() in cached['_flowText']
+            if field != '_flowText':
+                route[field] = value
+        routes.append(route)
+
     def sort_priority(route):
         if route['isEvent']:
             return 0
@@ -181,5 +147,5 @@ def searchroute(origin, destination):
         else:
             return 3
 
-    sorted_routes = sorted(routes_dict.values(), key=sort_priority)
-    return sorted_routes    
\ No newline at end of file
+    sorted_routes = sorted(routes, key=sort_priority)
+    return sorted_routes
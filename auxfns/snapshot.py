@@ -0,0 +1,109 @@
+#versioned cache snapshots
+import threading
+import time
+from auxfns.invalidation import on_change, poll_interval
+
+# Every cache collection (atis_cache, controller_cache, aircraft_cache) holds a
+# single document under this _id, replaced in one write on each refresh
+CACHE_KEY = "latest"
+
+
+def new_version():
+    """Millisecond snapshot version, also used as the ETag."""
+    return int(time.time() * 1000)
+
+
+def write_snapshot(collection, doc, version=None):
+    """
+    Replace the cache document in a single replace_one, so readers always see
+    either the previous snapshot or the new one, never an empty collection.
+    Stamps the document with version, a new one unless the caller made it
+    first to write something that must land before the snapshot.
+    """
+    doc["version"] = version if version is not None else new_version()
+    collection.replace_one({"_id": CACHE_KEY}, doc, upsert=True)
+    # Drop documents written before snapshots had a fixed key
+    collection.delete_many({"_id": {"$ne": CACHE_KEY}})
+    return doc["version"]
+
+
+SNAPSHOT_CHECK_INTERVAL = 1  # seconds between version reads per cache collection
+
+# collection name -> {"version", "checked_at", "loaded", "snapshot", "lock"}
+# Each worker holds the latest snapshot of every cache it serves and only
+# reads the version from Mongo, at most once per SNAPSHOT_CHECK_INTERVAL
+_held = {}
+_held_lock = threading.Lock()
+
+
+def _state(collection):
+    state = _held.get(collection.name)
+    if state is None:
+        with _held_lock:
+            state = _held.setdefault(collection.name, {
+                "version": None,
+                "checked_at": 0,
+                "loaded": None,
+                "snapshot": None,
+                "lock": threading.Lock()
+            })
+    return state
+
+
+def snapshot_version(collection):
+    """
+    Version of the latest snapshot in a cache collection, or None if it is
+    empty. Cheap enough to answer If-None-Match before touching the snapshot.
+    """
+    state = _state(collection)
+    now = time.time()
+    if now - state["checked_at"] >= poll_interval(SNAPSHOT_CHECK_INTERVAL):
+        doc = collection.find_one({"_id": CACHE_KEY}, {"_id": 0, "version": 1})
+        state["version"] = doc.get("version", 0) if doc else None
+        state["checked_at"] = now
+    return state["version"]
+
+
+def load_snapshot(collection, build=None):
+    """
+    Latest snapshot, passed through build(doc) once per version, or None if
+    the cache is empty. The full document is only read when the version changes.
+    """
+    state = _state(collection)
+    version = snapshot_version(collection)
+    if version is None:
+        return None
+    if state["loaded"] == version:
+        return state["snapshot"]
+
+    with state["lock"]:
+        if state["loaded"] == version:
+            return state["snapshot"]
+        doc = collection.find_one({"_id": CACHE_KEY})
+        if not doc:
+            return None
+        state["snapshot"] = build(doc) if build else doc
+        state["loaded"] = doc.get("version", 0)
+        return state["snapshot"]
+
+
+def _on_snapshot_change(event):
+    """Take a new snapshot's version straight from the change event, so the next request serves it."""
+    if event is None:
+        for state in list(_held.values()):
+            state["checked_at"] = 0
+        return
+    state = _held.get(event["ns"]["coll"])
+    if state is None or event.get("documentKey", {}).get("_id") != CACHE_KEY:
+        return
+    version = (event.get("fullDocument") or {}).get("version")
+    if version is None:
+        version = ((event.get("updateDescription") or {}).get("updatedFields") or {}).get("version")
+    if version is None:
+        state["checked_at"] = 0  # deleted, or changed without a version: read it again
+    else:
+        state["version"] = version
+        state["checked_at"] = time.time()
+
+
+on_change(["aircraft_cache", "controller_cache", "atis_cache"], _on_snapshot_change)
@@ -0,0 +1,141 @@
+#server-sent aircraft updates
+import queue
+import threading
+import time
+from flask import json
+from auxfns.snapshot import CACHE_KEY, snapshot_version
+from auxfns.metrics import inc, register_gauge
+from auxfns.traffic import current_traffic
+from models.db import aircraft_cache, aircraft_delta
+
+STREAM_POLL_INTERVAL = 1       # seconds between snapshot version checks by the watcher
+STREAM_HEARTBEAT = 15          # seconds of silence before a keep-alive comment
+STREAM_QUEUE_SIZE = 8          # updates buffered per subscriber before it is dropped
+MAX_STREAM_SUBSCRIBERS = 48    # per worker, below gunicorn --threads so plain requests still get a thread
+
+# One watcher thread per worker turns each new aircraft snapshot into a single
+# encoded event and hands it to every subscriber's queue
+_subscribers = set()
+_lock = threading.Lock()
+_watcher = {"thread": None, "version": None}
+# (version, encoded full snapshot event)
+_full = {"entry": None}
+
+
+def _event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+def full_event(snapshot):
+    """The whole aircraft list as one event, encoded once per snapshot version."""
+    entry = _full["entry"]
+    if entry is None or entry[0] != snapshot["version"]:
+        entry = (snapshot["version"], _event("snapshot", {
+            "version": snapshot["version"],
+            "aircraft": snapshot["aircraft"]
+        }))
+        _full["entry"] = entry
+    return entry[1]
+
+
+def _delta_event(version):
+    """Diff event reaching version, or None if update_cache hasn't stored one for it."""
+    doc = aircraft_delta.find_one({"_id": CACHE_KEY, "version": version}, {"_id": 0})
+    if not doc or doc.get("from") is None:
+        return None
+    return doc["from"], _event("delta", doc)
+
+
+def _publish(update):
+    with _lock:
+        subscribers = list(_subscribers)
+    for q in subscribers:
+        try:
+            q.put_nowait(update)
+        except queue.Full:
+            # Too slow to keep up: drop it, the client reconnects and starts from a snapshot
+            with _lock:
+                _subscribers.discard(q)
+            inc("ids_stream_dropped_total", {})
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(None)
+
+
+def _watch():
+    while True:
+        time.sleep(STREAM_POLL_INTERVAL)
+        with _lock:
+            if not _subscribers:
+                _watcher["thread"] = None
+                return
+        try:
+            version = snapshot_version(aircraft_cache)
+            if version is None or version == _watcher["version"]:
+                continue
+            delta = _delta_event(version)
+            # (from version, to version, event): subscribers that hold "from" take the diff
+            _publish((delta[0] if delta else None, version, delta[1] if delta else None))
+            _watcher["version"] = version
+        except Exception as e:
+            print(f"Error watching aircraft cache: {e}")
+
+
+def subscribe():
+    """A queue of (from, version, event) updates, or None if this worker is full."""
+    q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    with _lock:
+        if len(_subscribers) >= MAX_STREAM_SUBSCRIBERS:
+            return None
+        _subscribers.add(q)
+        if _watcher["thread"] is None:
+            _watcher["version"] = snapshot_version(aircraft_cache)
+            _watcher["thread"] = threading.Thread(target=_watch, daemon=True)
+            _watcher["thread"].start()
+    return q
+
+
+def unsubscribe(q):
+    with _lock:
+        _subscribers.discard(q)
+
+
+def aircraft_events(q):
+    """
+    Event stream for one subscriber: the full snapshot first, then a delta
+    per refresh. Whenever the client's version isn't the one a delta starts
+    from (missed update, no delta stored), it gets a full snapshot instead.
+    """
+    try:
+        snapshot = current_traffic()
+        version = None
+        if snapshot:
+            version = snapshot["version"]
+            yield full_event(snapshot)
+
+        while True:
+            try:
+                update = q.get(timeout=STREAM_HEARTBEAT)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if update is None:
+                return
+            start, target, event = update
+            if version is not None and target <= version:
+                continue
+            if event is not None and start == version:
+                version = target
+                yield event
+                continue
+            snapshot = current_traffic()
+            if snapshot and snapshot["version"] != version:
+                version = snapshot["version"]
+                yield full_event(snapshot)
+    finally:
+        unsubscribe(q)
+
+
+register_gauge("ids_stream_subscribers", "Open /ids/aircraft/stream connections in this worker", lambda: len(_subscribers))
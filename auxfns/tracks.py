@@ -0,0 +1,125 @@
+#aircraft track history
+import threading
+import time
+import numpy as np
+from auxfns.traffic import current_traffic
+
+MAX_TRACKS = 4096          # aircraft with a trail; new ones beyond this wait for a free slot
+TRAIL_LEN = 40             # points kept per aircraft, 10 minutes at the 15 s refresh
+TRACK_FIELDS = ["t", "lat", "lon", "alt", "gs"]
+TRACK_TTL = 120            # seconds an aircraft can be missing before its slot is freed
+TRACK_POLL_INTERVAL = 5    # seconds between snapshot checks by the recorder thread
+
+# Ring buffers for every tracked aircraft in one preallocated array, so memory
+# is fixed at MAX_TRACKS * TRAIL_LEN * 5 floats (~6.5 MB) however busy it gets:
+#   pool[slot, i] = (time, lat, lon, alt, gs); head[slot] is the next write
+#   position and count[slot] how many of the TRAIL_LEN points are filled
+_pool = np.full((MAX_TRACKS, TRAIL_LEN, len(TRACK_FIELDS)), np.nan)
+_head = np.zeros(MAX_TRACKS, dtype=int)
+_count = np.zeros(MAX_TRACKS, dtype=int)
+_last_seen = np.zeros(MAX_TRACKS)
+_slots = {}                               # callsign -> slot
+_free = list(range(MAX_TRACKS - 1, -1, -1))
+_state = {"version": None, "recorder": None}
+_lock = threading.Lock()
+
+
+def _evict(now):
+    """Free the slots of aircraft that haven't been in a snapshot for TRACK_TTL."""
+    for callsign, slot in list(_slots.items()):
+        if now - _last_seen[slot] > TRACK_TTL:
+            del _slots[callsign]
+            _count[slot] = 0
+            _head[slot] = 0
+            _free.append(slot)
+
+
+def record_snapshot(snapshot):
+    """Append every aircraft's position in a snapshot to its trail, once per version."""
+    version = snapshot.get("version")
+    with _lock:
+        if version is None or (_state["version"] is not None and version <= _state["version"]):
+            return
+        now = version / 1000
+        _evict(now)
+
+        rows = []
+        slots = []
+        seen = set()
+        for i, ac in enumerate(snapshot["aircraft"]):
+            callsign = ac.get("callsign")
+            if not callsign or callsign in seen:
+                continue
+            seen.add(callsign)
+            slot = _slots.get(callsign)
+            if slot is None:
+                if not _free:
+                    continue
+                slot = _free.pop()
+                _slots[callsign] = slot
+            rows.append(i)
+            slots.append(slot)
+
+        rows = np.array(rows, dtype=int)
+        slots = np.array(slots, dtype=int)
+        points = np.column_stack([
+            np.full(len(rows), now),
+            snapshot["lat"][rows],
+            snapshot["lon"][rows],
+            snapshot["altitude"][rows],
+            snapshot["speed"][rows]
+        ]) if len(rows) else np.empty((0, len(TRACK_FIELDS)))
+
+        _pool[slots, _head[slots]] = points
+        _head[slots] = (_head[slots] + 1) % TRAIL_LEN
+        _count[slots] = np.minimum(_count[slots] + 1, TRAIL_LEN)
+        _last_seen[slots] = now
+        _state["version"] = version
+
+
+def trails(callsigns):
+    """
+    callsign -> list of [t, lat, lon, alt, gs] points, oldest first, for the
+    callsigns that have a trail. All ring buffers are unrolled in one gather
+    of just their filled points.
+    """
+    with _lock:
+        found = [(c, _slots[c]) for c in callsigns if c in _slots]
+        if not found:
+            return {}
+        slots = np.array([slot for _, slot in found], dtype=int)
+        count = _count[slots]
+        ends = np.cumsum(count)
+        # Position of each point within its own trail: 0..count-1
+        steps = np.arange(ends[-1]) - np.repeat(ends - count, count)
+        # Oldest point first: start count positions behind the write head
+        index = (np.repeat(_head[slots] - count, count) + steps) % TRAIL_LEN
+        points = _pool[np.repeat(slots, count), index]
+
+    points = np.round(points, 4).tolist()
+    result = {}
+    for (callsign, _), end, n in zip(found, ends.tolist(), count.tolist()):
+        # NaN (missing altitude/speed) -> null; time as whole seconds
+        result[callsign] = [[int(p[0])] + [None if v != v else v for v in p[1:]] for p in points[end - n:end]]
+    return result
+
+
+def _record_loop():
+    while True:
+        try:
+            snapshot = current_traffic()
+            if snapshot:
+                record_snapshot(snapshot)
+        except Exception as e:
+            print(f"Error recording aircraft tracks: {e}")
+        time.sleep(TRACK_POLL_INTERVAL)
+
+
+def start_recorder():
+    """Start this worker's recorder thread once (threads don't survive gunicorn's fork)."""
+    if _state["recorder"] is not None:
+        return
+    with _lock:
+        if _state["recorder"] is None:
+            _state["recorder"] = threading.Thread(target=_record_loop, daemon=True)
+            _state["recorder"].start()
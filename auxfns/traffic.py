@@ -0,0 +1,225 @@
+#aircraft cache snapshot
+import threading
+import time
+from concurrent.futures import Future
+from math import cos, radians
+import numpy as np
+from auxfns.dist import finddist_np
+from auxfns.http import session
+from auxfns.snapshot import load_snapshot
+from models.db import aircraft_cache
+
+DJB_LAT, DJB_LON = 41.2129, -82.9431  # DJB VOR
+MIN_AIRBORNE_SPEED = 50  # kts, slower aircraft count as on the ground
+
+# Spatial index: aircraft bucketed into GRID_CELL_DEG x GRID_CELL_DEG cells,
+# cell id = row * GRID_COLS + col, rows counted from the south pole and
+# columns from the antimeridian
+GRID_CELL_DEG = 1.0
+GRID_ROWS = int(180 / GRID_CELL_DEG)
+GRID_COLS = int(360 / GRID_CELL_DEG)
+
+VATSIM_DATA_URL = "https://data.vatsim.net/v3/vatsim-data.json"
+LIVE_FEED_MAX_AGE = 15  # seconds a fallback download of the feed is reused
+
+
+def _column(aircraft, field):
+    # None becomes NaN, which fails every comparison and so never matches a filter
+    return np.array([ac.get(field) for ac in aircraft], dtype=float)
+
+
+def _row(lat):
+    return min(max(int((lat + 90) // GRID_CELL_DEG), 0), GRID_ROWS - 1)
+
+
+def _col(lon):
+    return min(max(int((lon + 180) // GRID_CELL_DEG), 0), GRID_COLS - 1)
+
+
+def _build_grid(lat, lon):
+    """
+    Sort aircraft by grid cell so each cell is a contiguous slice:
+    returns (sorted cell ids, aircraft indices in the same order).
+    """
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    rows = np.clip(((lat[valid] + 90) // GRID_CELL_DEG).astype(int), 0, GRID_ROWS - 1)
+    cols = ((lon[valid] + 180) // GRID_CELL_DEG).astype(int) % GRID_COLS
+    cells = rows * GRID_COLS + cols
+    order = np.argsort(cells, kind="stable")
+    return cells[order], valid[order]
+
+
+def _build_snapshot(doc):
+    aircraft = doc.get("aircraft", [])
+    lat = _column(aircraft, "lat")
+    lon = _column(aircraft, "lon")
+    grid_cells, grid_index = _build_grid(lat, lon)
+    return {
+        "version": doc.get("version"),
+        "updatedAt": doc.get("updatedAt"),
+        "artccCounts": doc.get("artccCounts", {}),
+        "aircraft": aircraft,
+        "lat": lat,
+        "lon": lon,
+        "speed": _column(aircraft, "speed"),
+        "altitude": _column(aircraft, "altitude"),
+        # Distance from DJB is computed once per refresh, not per request
+        "dist_djb": finddist_np(lat, lon, DJB_LAT, DJB_LON),
+        "grid_cells": grid_cells,
+        "grid_index": grid_index,
+        "by_callsign": {(ac.get("callsign") or "").upper(): ac for ac in aircraft}
+    }
+
+
+def current_traffic():
+    """
+    Latest aircraft snapshot as columns, or None if the cache is empty.
+    Rebuilt only when update_cache writes a new version.
+    """
+    return load_snapshot(aircraft_cache, _build_snapshot)
+
+
+def _bbox_candidates(snapshot, south, west, north, east):
+    """Indices of aircraft in the grid cells a bounding box overlaps."""
+    if west <= east:
+        col_ranges = [(_col(west), _col(east))]
+    else:
+        # Box crosses the antimeridian
+        col_ranges = [(_col(west), GRID_COLS - 1), (0, _col(east))]
+
+    starts = []
+    ends = []
+    for row in range(_row(south), _row(north) + 1):
+        for first, last in col_ranges:
+            starts.append(row * GRID_COLS + first)
+            ends.append(row * GRID_COLS + last)
+
+    # Each row of cells is one contiguous run of the sorted cell ids
+    cells = snapshot["grid_cells"]
+    lo = np.searchsorted(cells, starts, side="left")
+    hi = np.searchsorted(cells, ends, side="right")
+    index = snapshot["grid_index"]
+    chunks = [index[a:b] for a, b in zip(lo, hi) if b > a]
+    if not chunks:
+        return np.empty(0, dtype=int)
+    # Back in cache order, like the unindexed filter returned them
+    return np.sort(np.concatenate(chunks))
+
+
+def _select(snapshot, candidates, mask, include_ground):
+    if not include_ground:
+        mask &= snapshot["speed"][candidates] >= MIN_AIRBORNE_SPEED
+    aircraft = snapshot["aircraft"]
+    return [aircraft[i] for i in candidates[mask]]
+
+
+def aircraft_near_djb(snapshot, radius, include_ground):
+    """Aircraft within radius nm of DJB, as one vectorized mask over the snapshot."""
+    candidates = np.arange(len(snapshot["aircraft"]))
+    return _select(snapshot, candidates, snapshot["dist_djb"] <= radius, include_ground)
+
+
+def aircraft_in_radius(snapshot, lat, lon, radius, include_ground):
+    """Aircraft within radius nm of (lat, lon); only the grid cells around it are scanned."""
+    if (lat, lon) == (DJB_LAT, DJB_LON):
+        return aircraft_near_djb(snapshot, radius, include_ground)
+
+    dlat = radius / 60
+    south = max(lat - dlat, -90)
+    north = min(lat + dlat, 90)
+    if south <= -90 or north >= 90:
+        west, east = -180, 180
+    else:
+        dlon = dlat / cos(radians(max(abs(south), abs(north))))
+        if dlon >= 180:
+            west, east = -180, 180
+        else:
+            west = (lon - dlon + 180) % 360 - 180
+            east = (lon + dlon + 180) % 360 - 180
+
+    candidates = _bbox_candidates(snapshot, south, west, north, east)
+    dist = finddist_np(snapshot["lat"][candidates], snapshot["lon"][candidates], lat, lon)
+    return _select(snapshot, candidates, dist <= radius, include_ground)
+
+
+def aircraft_in_bbox(snapshot, south, west, north, east, include_ground):
+    """Aircraft inside a viewport; west > east means the box crosses the antimeridian."""
+    candidates = _bbox_candidates(snapshot, south, west, north, east)
+    lat = snapshot["lat"][candidates]
+    lon = snapshot["lon"][candidates]
+    mask = (lat >= south) & (lat <= north)
+    if west <= east:
+        mask &= (lon >= west) & (lon <= east)
+    else:
+        mask &= (lon >= west) | (lon <= east)
+    return _select(snapshot, candidates, mask, include_ground)
+
+
+# Fallback download of the live feed for callsigns missing from the snapshot.
+# Concurrent callers share the download in flight instead of starting their own.
+_live_pilots = {"pilots": None, "fetched_at": 0, "inflight": None}
+_live_lock = threading.Lock()
+
+
+def _fetch_live_pilots():
+    response = session.get(VATSIM_DATA_URL, timeout=5)
+    response.raise_for_status()
+    feed = response.json()
+    return {(p.get("callsign") or "").upper(): p for p in feed.get("pilots", [])}
+
+
+def live_pilots():
+    """Callsign -> pilot from the live VATSIM feed, downloaded at most once at a time."""
+    with _live_lock:
+        if _live_pilots["pilots"] is not None and time.time() - _live_pilots["fetched_at"] < LIVE_FEED_MAX_AGE:
+            return _live_pilots["pilots"]
+        inflight = _live_pilots["inflight"]
+        leader = inflight is None
+        if leader:
+            inflight = _live_pilots["inflight"] = Future()
+
+    if not leader:
+        return inflight.result()
+
+    try:
+        pilots = _fetch_live_pilots()
+    except Exception as e:
+        with _live_lock:
+            _live_pilots["inflight"] = None
+        inflight.set_exception(e)
+        raise
+
+    with _live_lock:
+        _live_pilots.update(pilots=pilots, fetched_at=time.time(), inflight=None)
+    inflight.set_result(pilots)
+    return pilots
+
+
+def lookup_flight_plan(callsign):
+    """
+    Filed departure/route/arrival for a callsign. Answered from the cached
+    snapshot when the callsign is in it, otherwise from the live feed.
+    Returns None if the callsign isn't connected and {} if it has no flight plan.
+    """
+    callsign = callsign.upper()
+    snapshot = current_traffic()
+    if snapshot is not None:
+        ac = snapshot["by_callsign"].get(callsign)
+        if ac is not None:
+            return {
+                "departure": ac.get("departure") or "",
+                "route": ac.get("route") or "",
+                "arrival": ac.get("destination") or ""
+            }
+
+    pilot = live_pilots().get(callsign)
+    if pilot is None:
+        return None
+    fp = pilot.get("flight_plan")
+    if not fp:
+        return {}
+    return {
+        "departure": fp.get("departure") or "",
+        "route": fp.get("route") or "",
+        "arrival": fp.get("arrival") or ""
+    }
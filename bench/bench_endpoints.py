@@ -0,0 +1,270 @@
+#end-to-end benchmark: every read-only /ids endpoint against mongomock (or a local mongod) with synthetic data
+#run from the repo root: python -m bench.bench_endpoints [--clients 8] [--requests 400] [--save | --compare]
+#python -m bench.bench_endpoints --record-feed replaces bench/data/vatsim_feed.json with the live VATSIM feed
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+from bench.synthetic import generate, canned_responses, CannedAdapter, AIRPORTS, VATSIM_DATA_URL
+
+DEFAULT_BASELINE = "bench/baseline.json"
+DEFAULT_FEED = "bench/data/vatsim_feed.json"
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def use_backend(mongo_uri):
+    """
+    Point every MongoClient the app creates at the benchmark database. Must
+    run before app, models.db or update_cache are imported.
+    """
+    if mongo_uri:
+        # Seeding replaces the ids collections, so only ever against a throwaway local server
+        if urlparse(mongo_uri).hostname not in LOCAL_HOSTS:
+            sys.exit(f"Refusing to seed {mongo_uri}: only local servers are supported")
+        os.environ["MONGO_URI"] = mongo_uri
+        return "mongod"
+
+    import mongomock
+    import pymongo
+    shared = mongomock.MongoClient()
+    # One in-memory server for app.py, models.db and update_cache alike; mongomock has no command monitoring
+    pymongo.MongoClient = lambda *args, **kwargs: shared
+    return f"mongomock {mongomock.__version__}"
+
+
+def record_feed(path):
+    """Save the live VATSIM feed, so every run (and the baseline) replays the same one."""
+    import requests
+    response = requests.get(VATSIM_DATA_URL, timeout=15)
+    response.raise_for_status()
+    feed = response.json()
+    with open(path, "w") as f:
+        json.dump(feed, f, separators=(",", ":"))
+    print(f"Saved {len(feed.get('pilots', []))} pilots to {path}")
+
+
+def seed(data):
+    """Load the synthetic collections and build the caches the way the refresher does."""
+    from models.db import db
+    from auxfns.routeindex import route_fields, faa_fields
+    for name, docs in data["collections"].items():
+        if name == "routes":
+            docs = [{**doc, **route_fields(doc)} for doc in docs]
+        elif name == "faa_prefroutes":
+            docs = [{**doc, **faa_fields(doc)} for doc in docs]
+        db[name].drop()
+        db[name].insert_many([dict(doc) for doc in docs])
+    for name in ("atis_cache", "controller_cache", "aircraft_cache", "aircraft_delta", "cache_versions", "leases"):
+        db[name].drop()
+
+    import update_cache
+    if not (update_cache.update_vatsim() and update_cache.update_wx()):
+        sys.exit("Seeding the caches failed, see above")
+
+
+def endpoints(data, etag):
+    """name -> list of (path, headers); clients cycle through the list."""
+    pilots = [p for p in data["vatsim"]["pilots"] if p.get("flight_plan")]
+    airways = data["collections"]["airways"]
+    fixes = [f["FIX_ID"] for f in data["collections"]["fixes"]]
+    stars = sorted({r["TRANSITION_COMPUTER_CODE"] for r in data["collections"]["star_rte"] if r.get("TRANSITION_COMPUTER_CODE")})
+    sids = sorted({r["TRANSITION_COMPUTER_CODE"] for r in data["collections"]["sid_rte"] if r.get("TRANSITION_COMPUTER_CODE")})
+    pairs = [(f["Orig"], f["Dest"]) for f in data["collections"]["faa_prefroutes"]]
+
+    def each(items, make, limit=50):
+        return [make(item) for item in items[:limit]]
+
+    return {
+        "airport_info": [("/ids/airport_info", {})],
+        "controllers": [("/ids/controllers", {})],
+        "aircraft": [("/ids/aircraft", {})],
+        "aircraft_304": [("/ids/aircraft", {"If-None-Match": etag})],
+        "aircraft_radius": [(f"/ids/aircraft?lat={lat}&lon={lon}&radius=250", {})
+                            for lat, lon in [(40.6, -73.8), (33.6, -84.4), (41.9, -87.9), (39.8, -104.7)]],
+        "aircraft_bbox": [("/ids/aircraft?bbox=-90,38,-76,45", {}), ("/ids/aircraft?bbox=-125,25,-67,49", {})],
+        "aircraft_routes": [("/ids/aircraft/routes", {})],
+        "aircraft_counts": [("/ids/aircraft/counts", {})],
+        "aircraft_trails": [("/ids/aircraft/trails?bbox=-90,38,-76,45", {})],
+        "routes": each(pairs, lambda p: (f"/ids/routes?origin={p[0]}&destination={p[1]}", {})),
+        "routes_origin": each(AIRPORTS, lambda a: (f"/ids/routes?origin={a}", {})),
+        "fix": each(list(range(50)), lambda i: (f"/ids/fix?fixes={','.join(fixes[i * 10:(i + 1) * 10])}", {})),
+        "airway": each(airways, lambda a: (f"/ids/airway?id={a['AWY_ID']}", {})),
+        "star": each(stars, lambda code: (f"/ids/star?code={code}", {})),
+        "sid": each(sids, lambda code: (f"/ids/sid?code={code}", {})),
+        "expand_route": each(pilots, lambda p: (
+            f"/ids/expand-route?route={p['flight_plan']['route'].replace(' ', '+')}"
+            f"&departure={p['flight_plan']['departure']}&arrival={p['flight_plan']['arrival']}", {})),
+        "crossings": each(AIRPORTS, lambda a: (f"/ids/crossings?destination=K{a}", {})),
+        "enroute": each(AIRPORTS, lambda a: (f"/ids/enroute?field={a}", {})),
+        "route_to_skyvector": each(pilots, lambda p: (f"/ids/route-to-skyvector?callsign={p['callsign']}", {})),
+        "metrics": [("/ids/metrics", {})],
+    }
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+def run_endpoint(app, requests_list, total, clients):
+    """total requests spread over clients threads, each with its own test client."""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(clients + 1)
+
+    def client(worker):
+        test_client = app.test_client()
+        mine = []
+        start.wait()
+        for i in range(worker, total, clients):
+            path, headers = requests_list[i % len(requests_list)]
+            started = time.perf_counter()
+            response = test_client.get(path, headers=headers)
+            response.get_data()
+            mine.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                with lock:
+                    errors.append(f"{path} -> {response.status_code}")
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(w,)) for w in range(clients)]
+    for t in threads:
+        t.start()
+    start.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "rps": round(len(latencies) / wall, 1),
+        "errors": len(errors)
+    }, errors[:3]
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a saved run; returns the endpoints that regressed beyond tolerance."""
+    regressed = []
+    print(f"\nAgainst baseline from {baseline['meta'].get('date')} ({baseline['meta'].get('git')}):")
+    for name, now in results.items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            print(f"  {name:20} new")
+            continue
+        p99 = now["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0
+        rps = now["rps"] / before["rps"] - 1 if before["rps"] else 0
+        worse = p99 > tolerance or rps < -tolerance
+        if worse:
+            regressed.append(name)
+        print(f"  {name:20} p99 {p99:+7.1%}  rps {rps:+7.1%}{'  REGRESSION' if worse else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every read-only /ids endpoint with concurrent clients")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients per endpoint")
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the synthetic document counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", help="comma-separated endpoint names")
+    parser.add_argument("--feed", default=DEFAULT_FEED,
+                        help="recorded VATSIM feed to serve; '' for a synthetic one sized by --scale")
+    parser.add_argument("--record-feed", action="store_true", help="download the live VATSIM feed to --feed and exit")
+    parser.add_argument("--mongo-uri", help="local mongod to use instead of mongomock (its ids collections are replaced)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="compare with the baseline, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p99/throughput change before --compare fails")
+    args = parser.parse_args()
+
+    if args.record_feed:
+        record_feed(args.feed or DEFAULT_FEED)
+        return 0
+
+    backend = use_backend(args.mongo_uri)
+    data = generate(args.seed, args.scale)
+    if args.feed:
+        with open(args.feed, "r") as f:
+            data["vatsim"] = json.load(f)
+    with open("bench/data/atis_samples.json", "r") as f:
+        atis_samples = json.load(f)
+
+    # Outbound D-ATIS/METAR/VATSIM calls all go through the shared session
+    from auxfns.http import session
+    session.mount("https://", CannedAdapter(canned_responses(data, atis_samples)))
+
+    seed(data)
+    # Imported after seeding, so the navdata index it builds at import holds the synthetic cycle
+    from app import app, start_background_threads
+    start_background_threads()
+
+    etag = app.test_client().get("/ids/aircraft").headers.get("ETag")
+    targets = endpoints(data, etag)
+    if args.only:
+        targets = {name: targets[name] for name in args.only.split(",")}
+
+    print(f"{backend}, {args.clients} clients, {args.requests} requests per endpoint, scale {args.scale}, "
+          f"feed {args.feed or 'synthetic'} ({len(data['vatsim'].get('pilots', []))} pilots)")
+    print(f"{'endpoint':20} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+    results = {}
+    for name, requests_list in targets.items():
+        # One unmeasured pass so per-version bodies are in place
+        run_endpoint(app, requests_list, len(requests_list), 1)
+        results[name], errors = run_endpoint(app, requests_list, args.requests, args.clients)
+        r = results[name]
+        print(f"{name:20} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {r['rps']:9.1f} {r['errors']:7}")
+        for error in errors:
+            print(f"    {error}")
+
+    meta = {
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git": _git_rev(),
+        "backend": backend,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "clients": args.clients,
+        "requests": args.requests,
+        "scale": args.scale,
+        "seed": args.seed,
+        "feed": args.feed or None,
+        "pilots": len(data["vatsim"].get("pilots", []))
+    }
+
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"No baseline at {args.baseline}; run with --save first")
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        differs = [k for k in ("backend", "clients", "requests", "scale", "seed", "feed", "pilots", "machine") if baseline["meta"].get(k) != meta[k]]
+        if differs:
+            print(f"Warning: baseline was run with different {', '.join(differs)}")
+        if compare(results, baseline, args.tolerance):
+            status = 1
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": meta, "endpoints": results}, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#micro-benchmark: runway flow detection, old per-runway re.search loops vs auxfns.flowdetect
+#run from the repo root: python -m bench.bench_flowdetect [iterations]
+import re
+import sys
+import json
+import timeit
+from auxfns.flowdetect import RUNWAY_FLOW_MAP, BOTH_PHRASES, DEPARTURE_PHRASES, ARRIVAL_PHRASES, detect_flow, departure_flow, datis_text
+
+with open("bench/data/atis_samples.json", "r") as f:
+    SAMPLES = json.load(f)
+
+
+def legacy_flow(airport_code, atis_datis):
+    """Departure flow the way get_flow found it before flowdetect (three searches per runway)"""
+    flow_config = RUNWAY_FLOW_MAP[airport_code]
+    for flow_direction, runways in flow_config.items():
+        for rwy in runways:
+            if re.search(rf"DEPG RWY {rwy}[LRC]?", atis_datis) or \
+               re.search(rf"DEPG RWYS {rwy}[LRC]?", atis_datis) or \
+               re.search(rf"DEPTG RWY {rwy}[LRC]?", atis_datis):
+                return flow_direction.upper()
+    return None
+
+
+def legacy_search(airport_code, atis_datis, phrases):
+    flow_config = RUNWAY_FLOW_MAP[airport_code]
+    for flow_direction, runways in flow_config.items():
+        for rwy in runways:
+            for phrase in phrases:
+                if re.search(rf"{phrase} RWYS? {rwy}[LRC]?(?!\d)", atis_datis):
+                    return flow_direction.upper()
+    return None
+
+
+def legacy_both(airport_code, atis_datis):
+    """Departure and arrival flow with the same per-runway searches, for a like-for-like comparison"""
+    return (legacy_search(airport_code, atis_datis, BOTH_PHRASES + DEPARTURE_PHRASES),
+            legacy_search(airport_code, atis_datis, BOTH_PHRASES + ARRIVAL_PHRASES))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = [(sample["airport"], datis_text(sample["datis"])) for sample in SAMPLES]
+
+    # All must agree on the flows before timing means anything
+    for code, text in cases:
+        flow = detect_flow(code, text)
+        if legacy_flow(code, text) != flow["departure"] or departure_flow(code, text) != flow["departure"] or \
+           legacy_both(code, text) != (flow["departure"], flow["arrival"]):
+            print(f"MISMATCH {code}: legacy={legacy_both(code, text)} flowdetect={flow}")
+            return 1
+
+    def run_legacy():
+        for code, text in cases:
+            legacy_flow(code, text)
+
+    def run_departure_flow():
+        for code, text in cases:
+            departure_flow(code, text)
+
+    def run_legacy_both():
+        for code, text in cases:
+            legacy_both(code, text)
+
+    def run_flowdetect():
+        for code, text in cases:
+            detect_flow(code, text)
+
+    calls = iterations * len(cases)
+    # Route search only needs the departure flow, update_wx needs both and the runways
+    runs = (
+        ("legacy departure only", run_legacy),
+        ("departure_flow", run_departure_flow),
+        ("legacy departure+arrival", run_legacy_both),
+        ("flowdetect (both + runways)", run_flowdetect)
+    )
+    for name, fn in runs:
+        seconds = min(timeit.repeat(fn, number=iterations, repeat=3))
+        print(f"{name:>28}: {seconds / calls * 1e6:8.2f} us/ATIS ({calls} calls)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#synthetic NASR, route and VATSIM data plus canned HTTP responses for bench_endpoints
+import json
+import random
+import string
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Three-letter ids as the app stores them; the first ones have runway flows and D-ATIS samples
+AIRPORTS = ["DTW", "CLE", "BUF", "PIT", "ATL", "DFW", "ORD", "JFK", "EWR", "BOS", "IAD", "DCA",
+            "CLT", "MCO", "MIA", "DEN", "LAX", "SFO", "SEA", "MSP", "STL", "CMH", "IND", "MDW",
+            "LGA", "PHL", "BWI", "DAY", "CVG", "ROC", "SYR", "ALB"]
+DJB = (41.2129, -82.9431)
+
+# Document counts at scale 1: a fraction of the real NASR/FAA tables, enough
+# that scans and index builds are not free
+COUNTS = {
+    "fixes": 20000,
+    "navaids": 1500,
+    "airways": 400,
+    "stars": 120,
+    "sids": 120,
+    "faa_prefroutes": 3000,
+    "routes": 300,
+    "crossings": 200,
+    "enroute": 300,
+    "pilots": 1500,
+}
+
+VATSIM_DATA_URL = "https://data.vatsim.net/v3/vatsim-data.json"
+VNAS_URL = "https://live.env.vnas.vatsim.net/data-feed/controllers.json"
+
+
+def _name(rng, length, taken):
+    while True:
+        name = "".join(rng.choice(string.ascii_uppercase) for _ in range(length))
+        if name not in taken:
+            taken.add(name)
+            return name
+
+
+def _conus(rng):
+    return round(rng.uniform(25, 49), 6), round(rng.uniform(-124, -68), 6)
+
+
+def _near_djb(rng, spread=5):
+    return round(DJB[0] + rng.uniform(-spread, spread), 6), round(DJB[1] + rng.uniform(-spread, spread), 6)
+
+
+def _procedure_rows(rng, kind, count, fixes, taken):
+    """STAR or SID rows shaped like NASR's STAR_RTE/DP_RTE: a body plus a few transitions each."""
+    code_field = "STAR_COMPUTER_CODE" if kind == "star" else "SID_COMPUTER_CODE"
+    rows, names = [], []
+    for _ in range(count):
+        name = _name(rng, 5, taken) + str(rng.randint(1, 9))
+        names.append(name)
+        body = rng.sample(fixes, 6)
+        for seq, point in enumerate(body):
+            rows.append({code_field: name, "ROUTE_NAME": f"{name} {kind.upper()}", "POINT": point,
+                         "POINT_SEQ": (seq + 1) * 10, "ARPT_RWY_ASSOC": "" if seq else rng.choice(["", "04L/04R"])})
+        for _ in range(3):
+            entry = rng.choice(fixes)
+            code = f"{entry}.{name}" if kind == "star" else f"{name}.{entry}"
+            leg = [entry] + rng.sample(fixes, 3) + [body[0] if kind == "star" else body[-1]]
+            for seq, point in enumerate(leg):
+                rows.append({code_field: name, "ROUTE_NAME": f"{entry} TRANSITION", "TRANSITION_COMPUTER_CODE": code,
+                             "POINT": point, "POINT_SEQ": (seq + 1) * 10, "ARPT_RWY_ASSOC": ""})
+    return rows, names
+
+
+def generate(seed=42, scale=1.0):
+    """Every collection the app reads, plus the VATSIM and vNAS feeds, deterministic per seed."""
+    rng = random.Random(seed)
+    n = {name: max(1, int(count * scale)) for name, count in COUNTS.items()}
+    taken = set(AIRPORTS)
+
+    fixes = [{"FIX_ID": _name(rng, 5, taken), **dict(zip(("LAT_DECIMAL", "LONG_DECIMAL"), _conus(rng)))}
+             for _ in range(n["fixes"])]
+    navaids = [{"NAV_ID": _name(rng, 3, taken), **dict(zip(("LAT_DECIMAL", "LONG_DECIMAL"), _conus(rng)))}
+               for _ in range(n["navaids"])]
+    fix_ids = [f["FIX_ID"] for f in fixes]
+
+    airways = []
+    for i in range(n["airways"]):
+        airways.append({"AWY_ID": f"{rng.choice('JQV')}{i + 1}",
+                        "AIRWAY_STRING": " ".join(rng.sample(fix_ids, rng.randint(8, 30)))})
+
+    stars, star_names = _procedure_rows(rng, "star", n["stars"], fix_ids, taken)
+    sids, sid_names = _procedure_rows(rng, "sid", n["sids"], fix_ids, taken)
+
+    def route_string():
+        airway = rng.choice(airways)
+        points = airway["AIRWAY_STRING"].split()
+        i, j = sorted(rng.sample(range(len(points)), 2))
+        return f"{rng.choice(sid_names)} {points[i]} {airway['AWY_ID']} {points[j]} {rng.choice(star_names)}"
+
+    faa = [{"Orig": rng.choice(AIRPORTS), "Dest": rng.choice(AIRPORTS), "RouteString": route_string(),
+            "Area": rng.choice(["", "ZOB", "ZNY ZDC", "EVENT ONLY"]), "Direction": rng.choice(["", "NORTH", "SOUTH", "WEST"]),
+            "Aircraft": rng.choice(["", "JETS", "TURBOPROPS"])} for _ in range(n["faa_prefroutes"])]
+    routes = [{"origin": rng.choice(AIRPORTS), "destination": rng.choice(AIRPORTS), "route": route_string(),
+               "altitude": rng.choice(["", "FL240", "11000"]), "notes": rng.choice(["", "NORTH FLOW", "SOUTH FLOW", "EVENT"])}
+              for _ in range(n["routes"])]
+    crossings = [{"destination": rng.choice(AIRPORTS), "bdry_fix": rng.choice(fix_ids),
+                  "restriction": f"AT OR BELOW FL{rng.randint(20, 35)}0", "notes": "", "artcc": rng.choice(["ZOB", "ZNY", "ZID", "ZAU"])}
+                 for _ in range(n["crossings"])]
+    enroute = [{"Field": " ".join(rng.sample(AIRPORTS, 3)), "Qualifier": rng.choice(["", "JETS", "PROPS"]),
+                "Areas": rng.choice(["ZOB", "ZOB ZID", "ZNY"]), "Rule": f"VIA {rng.choice(fix_ids)} AT FL{rng.randint(20, 35)}0"}
+               for _ in range(n["enroute"])]
+
+    pilots = []
+    for i in range(n["pilots"]):
+        lat, lon = _near_djb(rng) if i % 3 else _conus(rng)
+        pilot = {"callsign": f"{rng.choice(['AAL', 'DAL', 'UAL', 'SWA', 'JBU', 'N'])}{i + 100}", "latitude": lat, "longitude": lon,
+                 "altitude": rng.choice([0, rng.randint(3000, 41000)]), "heading": rng.randint(0, 359),
+                 "groundspeed": rng.choice([0, rng.randint(140, 520)])}
+        if i % 10:
+            pilot["flight_plan"] = {"departure": "K" + rng.choice(AIRPORTS), "arrival": "K" + rng.choice(AIRPORTS),
+                                    "route": route_string(), "aircraft_short": rng.choice(["B738", "A320", "E175", "C172"])}
+        pilots.append(pilot)
+    vatsim = {
+        "general": {"update_timestamp": "2025-01-01T00:00:00.0000000Z"},
+        "pilots": pilots,
+        "controllers": [{"callsign": cs, "frequency": "132.500"} for cs in ("TOR_CTR", "MTL_1_CTR", "CZEG_FSS", "CLE_APP")]
+    }
+    vnas = {"controllers": [
+        {"isActive": True, "isObserver": False, "artccId": artcc,
+         "vatsimData": {"facilityType": facility, "callsign": f"{artcc[1:]}_{i}_CTR"}}
+        for i, (artcc, facility) in enumerate([("ZOB", "Center"), ("ZNY", "Center"), ("ZID", "Center"),
+                                              ("ZOB", "ApproachDeparture"), ("ZAU", "Center")])
+    ]}
+
+    return {
+        "collections": {
+            "fixes": fixes, "navaids": navaids, "airways": airways, "star_rte": stars, "sid_rte": sids,
+            "faa_prefroutes": faa, "routes": routes, "crossings": crossings, "enroute": enroute,
+            "navdata_meta": [{"_id": "nasr", "cycle": f"bench-{seed}"}]
+        },
+        "vatsim": vatsim,
+        "vnas": vnas,
+        "star_names": star_names,
+        "sid_names": sid_names
+    }
+
+
+class CannedAdapter(BaseAdapter):
+    """Transport adapter answering every outbound request from memory, so hooks and parsing run as usual."""
+
+    def __init__(self, responses):
+        super().__init__()
+        # [(url prefix, fn(url) -> (status, body))], first match wins
+        self.responses = responses
+
+    def send(self, request, **kwargs):
+        status, body = 404, ""
+        for prefix, answer in self.responses:
+            if request.url.startswith(prefix):
+                status, body = answer(request.url)
+                break
+        response = Response()
+        response.status_code = status
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        content_type = "text/plain" if isinstance(body, str) else "application/json"
+        response._content = (body if isinstance(body, str) else json.dumps(body)).encode()
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+        return response
+
+    def close(self):
+        pass
+
+
+def canned_responses(data, atis_samples):
+    """D-ATIS from the recorded samples, a fixed METAR and the synthetic VATSIM/vNAS feeds."""
+    datis = {}
+    for sample in atis_samples:
+        datis.setdefault("K" + sample["airport"], sample["datis"])
+
+    def datis_answer(url):
+        code = url.rsplit("/", 1)[-1]
+        return (200, datis[code]) if code in datis else (404, {"error": "not found"})
+
+    def metar_answer(url):
+        return 200, f"{url.rsplit('/', 1)[-1]} 011853Z 21012KT 10SM FEW050 BKN250 24/12 A3002"
+
+    return [
+        ("https://datis.clowd.io/api/", datis_answer),
+        ("https://metar.vatsim.net/", metar_answer),
+        (VATSIM_DATA_URL, lambda url: (200, data["vatsim"])),
+        (VNAS_URL, lambda url: (200, data["vnas"]))
+    ]
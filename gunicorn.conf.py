@@ -0,0 +1,12 @@
+#gunicorn settings shared by the dockerfile and the Procfile
+# Preload so workers share the navdata index built at import
+preload_app = True
+worker_class = "gthread"
+# Every /ids/aircraft/stream subscriber holds a thread open
+threads = 64
+
+
+def post_fork(server, worker):
+    # Start each worker's background threads as soon as it exists, not on its first request
+    from app import start_background_threads
+    start_background_threads()
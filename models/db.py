@@ -0,0 +1,36 @@
+import os
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from auxfns.metrics import command_timer
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+
+# Shared client for the helper modules in auxfns, so each of them doesn't open
+# its own connection pool. connect=False: nothing connects in the preloaded
+# gunicorn master, each worker opens its own pool on first use.
+client = MongoClient(MONGO_URI, event_listeners=[command_timer], connect=False)
+
+db = client["ids"]
+routes_collection = db["routes"]
+crossings_collection = db["crossings"]
+faa_routes_collection = db["faa_prefroutes"]
+fixes_collection = db["fixes"]
+navaids_collection = db["navaids"]
+airway_collection = db["airways"]
+star_rte_collection = db["star_rte"]
+dp_rte_collection = db["sid_rte"]
+enroute_collection = db["enroute"]
+# Holds {"_id": "nasr", "cycle": ...}; bumped whenever a new AIRAC cycle is imported
+navdata_meta = db["navdata_meta"]
+# Write counters ({"_id": <name>, "version": n}) per-worker caches check for staleness
+cache_versions = db["cache_versions"]
+
+atis_cache = db["atis_cache"]
+controller_cache = db["controller_cache"]
+aircraft_cache = db["aircraft_cache"]
+# Diff between the last two aircraft snapshots ({"from", "version", "added", "removed", "changed"})
+aircraft_delta = db["aircraft_delta"]
+# Leases for work only one process should do ({"_id": <name>, "holder", "expiresAt", ...})
+leases = db["leases"]
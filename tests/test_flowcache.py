@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+from auxfns import flowcache
+
+
+class RefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        flowcache._flow_memo.clear()
+        self.now = 1_000_000.0
+        patches = [
+            mock.patch.object(flowcache.time, "time", lambda: self.now),
+            mock.patch.object(flowcache, "_flow_from_atis_cache", return_value=(False, None)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def refresh(self, datis):
+        with mock.patch.object(flowcache, "_flow_from_datis", return_value=datis):
+            flowcache._refresh("DTW")
+        return flowcache._flow_memo["DTW"][0]
+
+    def test_stale_flow_expires_while_datis_keeps_failing(self):
+        self.assertEqual(self.refresh((True, "SOUTH")), "SOUTH")
+
+        # Failed refreshes every TTL serve the last flow, but only up to FLOW_STALE_LIMIT after it was resolved
+        resolved_at = self.now
+        while self.now + flowcache.FLOW_TTL - resolved_at < flowcache.FLOW_STALE_LIMIT:
+            self.now += flowcache.FLOW_TTL
+            self.assertEqual(self.refresh((False, None)), "SOUTH")
+        self.now += flowcache.FLOW_TTL
+        self.assertIsNone(self.refresh((False, None)))
+        self.assertIsNone(self.refresh((False, None)))
+
+    def test_fetched_datis_without_flow_replaces_old_flow(self):
+        self.refresh((True, "SOUTH"))
+        self.now += flowcache.FLOW_TTL
+        self.assertIsNone(self.refresh((True, None)))
+
+    def test_atis_cache_none_replaces_old_flow(self):
+        self.refresh((True, "SOUTH"))
+        self.now += flowcache.FLOW_TTL
+        with mock.patch.object(flowcache, "_flow_from_atis_cache", return_value=(True, None)):
+            self.assertIsNone(self.refresh((False, None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,9 +3,17 @@ import re
 import time
 import json
 import os
-from math import radians, sin, cos, asin, sqrt
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 from dotenv import load_dotenv
+from auxfns.http import session
+from auxfns.metrics import command_timer
+from auxfns.snapshot import CACHE_KEY, new_version, write_snapshot
+from auxfns.boundaries import tag_artccs
+from auxfns.flowdetect import detect_flow, fetch_datis, datis_text, format_atis
 
 
 load_dotenv('/root/.env') # FOR PROD
@@ -14,60 +22,23 @@ load_dotenv('/root/.env') # FOR PROD
 MONGO_URI = os.getenv("MONGO_URI")
 ATIS_AIRPORTS = ["KDTW","KCLE","KBUF","KPIT"]
 
-with open("data/runway_flow.json", "r") as f:
-    RUNWAY_FLOW_MAP = json.load(f)
-
 # Make sure these are defined somewhere accessible:
 # RUNWAY_FLOW_MAP = {...}
 # ATIS_AIRPORTS = [...]
 
 
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[command_timer])
 
 db = client["ids"]
 aircraft_cache = db["aircraft_cache"]
 controller_cache = db["controller_cache"]
 atis_cache = db["atis_cache"]
-
-def get_flow(airport_code):
-    airport_code = airport_code.upper()
-    if airport_code not in RUNWAY_FLOW_MAP:
-        return None
-    try:
-        aptIcao = "K" + airport_code
-        datis_url = f"https://datis.clowd.io/api/{aptIcao}"
-        response = requests.get(datis_url, timeout=5)
-        if response.status_code != 200:
-            return None
-
-        atis_data = response.json()
-        if not isinstance(atis_data, list) or len(atis_data) == 0:
-            return None
-
-        # Prefer departure ATIS if available
-        if len(atis_data) > 1:
-            atis_text = atis_data[1]
-        else:
-            atis_text = atis_data[0]
-
-        atis_datis = atis_text.get('datis', "")
-
-        flow_config = RUNWAY_FLOW_MAP[airport_code]
-        for flow_direction, runways in flow_config.items():
-            for rwy in runways:
-                if re.search(rf"DEPG RWY {rwy}[LRC]?", atis_datis) or \
-                   re.search(rf"DEPG RWYS {rwy}[LRC]?", atis_datis) or \
-                   re.search(rf"DEPTG RWY {rwy}[LRC]?", atis_datis):
-                    return flow_direction.upper()
-        return None
-    except Exception as e:
-        print(f"Flow detection error for {airport_code}: {e}")
-        return None
+aircraft_delta = db["aircraft_delta"]
 
 def get_metar(icao):
     url = f"https://metar.vatsim.net/{icao}"
     try:
-        response = requests.get(url, timeout=5)
+        response = session.get(url, timeout=5)
         if response.status_code != 200:
             return f"Error: API returned status {response.status_code}"
         text = response.text.strip()
@@ -77,19 +48,35 @@ def get_metar(icao):
     except Exception as e:
         return f"Error: {str(e)}"
 
-def get_atis(station):
+def get_atis_and_flow(station):
+    """
+    ATIS text, departure/arrival flow and active runways from a single D-ATIS
+    download, instead of fetching the same document once for each.
+    """
+    info = {"atis": None, "flow": None, "arrivalFlow": None, "runways": None}
     try:
-        response = requests.get(f"https://datis.clowd.io/api/K{station}", timeout=5)
-        if response.status_code != 200:
-            return None
-        datis = response.json()
-        if datis[0]["type"] == "combined":
-            return datis[0]["datis"]
-        elif len(datis) > 1:
-            return f"Departure: {datis[1]['datis']}\nArrival: {datis[0]['datis']}"
-        return datis[0]["datis"]
+        datis = fetch_datis(station)
+        if datis is None:
+            return info
+        info["atis"] = format_atis(datis)
+    except Exception as e:
+        info["atis"] = f"ATIS fetch failed: {e}"
+        return info
+
+    try:
+        flow = detect_flow(station, datis_text(datis))
+        if flow:
+            info["flow"] = flow["departure"]
+            info["arrivalFlow"] = flow["arrival"]
+            info["runways"] = {
+                "departure": flow["departure_runways"],
+                "arrival": flow["arrival_runways"]
+            }
     except Exception as e:
-        return f"ATIS fetch failed: {e}"
+        print(f"Flow detection error for {station}: {e}")
+    return info
+
+WX_WORKERS = 12  # concurrent METAR/D-ATIS requests
 
 def update_wx():
     print("Refreshing airport info cache...")
@@ -97,23 +84,23 @@ def update_wx():
         "updatedAt": time.ctime(),
         "airports": {}
     }
-    for airport in ATIS_AIRPORTS:
-        code = airport.replace("K", "")
-        data["airports"][airport] = {
-            "metar": get_metar(airport),
-            "atis": get_atis(code),
-            "flow": get_flow(code)
-        }
-    try:
-        # Remove existing cache documents
-        atis_cache.delete_many({})
+    # Every METAR/D-ATIS call runs concurrently; each one has its own timeout
+    with ThreadPoolExecutor(max_workers=WX_WORKERS) as pool:
+        pending = {}
+        for airport in ATIS_AIRPORTS:
+            code = airport.replace("K", "")
+            pending[airport] = (pool.submit(get_metar, airport), pool.submit(get_atis_and_flow, code))
+    for airport, (metar, atis) in pending.items():
+        data["airports"][airport] = {"metar": metar.result(), **atis.result()}
 
-        # Insert the new cache as a single document
-        atis_cache.insert_one(data)
+    try:
+        write_snapshot(atis_cache, data)
 
         print(f"Airport info cache updated at {data['updatedAt']}")
+        return True
     except Exception as e:
         print(f"Error updating airport info cache in MongoDB: {e}")
+        return False
 
 
 callsign_to_artcc = {
@@ -126,12 +113,59 @@ callsign_to_artcc = {
     "CZEG": "CZEG",
 }
 
-def fetch_controller_data():
+VATSIM_DATA_URL = "https://data.vatsim.net/v3/vatsim-data.json"
+
+# Validators and parsed body of the last vatsim-data.json download
+vatsim_feed = {
+    "etag": None,
+    "last_modified": None,
+    "fetched_at": 0,
+    "data": None
+}
+vatsim_feed_lock = threading.Lock()
+
+def fetch_vatsim_feed(max_age=0):
+    """
+    Download and parse vatsim-data.json, shared by every cache derived from it.
+    A copy fetched less than max_age seconds ago is reused as is. Sends the
+    previous ETag/Last-Modified so an unchanged feed costs a 304.
+    Returns None if the feed is unavailable.
+    """
+    with vatsim_feed_lock:
+        if vatsim_feed["data"] is not None and time.time() - vatsim_feed["fetched_at"] < max_age:
+            return vatsim_feed["data"]
+
+        headers = {'Accept': 'application/json'}
+        if vatsim_feed["etag"]:
+            headers['If-None-Match'] = vatsim_feed["etag"]
+        if vatsim_feed["last_modified"]:
+            headers['If-Modified-Since'] = vatsim_feed["last_modified"]
+
+        try:
+            response = session.get(VATSIM_DATA_URL, headers=headers, timeout=10)
+            if response.status_code == 304:
+                vatsim_feed["fetched_at"] = time.time()
+                return vatsim_feed["data"]
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            print(f"Error fetching VATSIM data: {e}")
+            return None
+
+        vatsim_feed["etag"] = response.headers.get("ETag")
+        vatsim_feed["last_modified"] = response.headers.get("Last-Modified")
+        vatsim_feed["fetched_at"] = time.time()
+        vatsim_feed["data"] = data
+        return data
+
+def feed_timestamp(vatsim_data):
+    return vatsim_data.get("general", {}).get("update_timestamp")
+
+def fetch_controller_data(vatsim_data):
     vnasurl = "https://live.env.vnas.vatsim.net/data-feed/controllers.json"
-    vatsimurl = "https://data.vatsim.net/v3/vatsim-data.json"
-    
+
     try:
-        vnas_response = requests.get(vnasurl)
+        vnas_response = session.get(vnasurl, timeout=10)
         vnas_response.raise_for_status()
         vnas_data = vnas_response.json()
 
@@ -148,10 +182,6 @@ def fetch_controller_data():
             and c.get("artccId") == "ZOB"
         ]
 
-        vatsim_response = requests.get(vatsimurl)
-        vatsim_response.raise_for_status()
-        vatsim_data = vatsim_response.json()
-
         canadian_controllers = []
         for controller in vatsim_data.get("controllers", []):
             callsign = controller.get("callsign", "").upper()
@@ -159,8 +189,8 @@ def fetch_controller_data():
             if match:
                 prefix = match.group(1)
                 if prefix in callsign_to_artcc:
-                    controller["artccId"] = callsign_to_artcc[prefix]
-                    canadian_controllers.append(controller)
+                    # Copy, the parsed feed is shared with the other caches
+                    canadian_controllers.append({**controller, "artccId": callsign_to_artcc[prefix]})
 
         filtered_data = {
             "controllers": center_controllers + canadian_controllers,
@@ -173,47 +203,25 @@ def fetch_controller_data():
         print(f"Error fetching controller data: {e}")
         return None
 
-def update_controllers():
-    data = fetch_controller_data()
+def update_controllers(vatsim_data):
+    data = fetch_controller_data(vatsim_data)
     if data:
         data['cacheUpdatedAt'] = time.ctime()  # Add local update time
+        data['feedUpdatedAt'] = vatsim_data.get("general", {}).get("update_timestamp")
         try:
-            # Clear the old cache
-            controller_cache.delete_many({})
-
-            # Insert the new one
-            controller_cache.insert_one(data)
+            write_snapshot(controller_cache, data)
 
             print(f"Controller cache updated at {data['cacheUpdatedAt']}")
+            return True
         except Exception as e:
             print(f"Error updating controller cache in MongoDB: {e}")
     else:
         print("Failed to update controller cache")
+    return False
 
 
-MAX_CACHE_RADIUS = 1000      # nautical miles for cache
-
-def finddist(lat1, lon1, lat2, lon2):
-    R = 3440.065  # Radius of Earth in nautical miles
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    return R * c
-
-def fetch_aircraft_data(radius_nm):
-    url = "https://data.vatsim.net/v3/vatsim-data.json"
-    headers = {'Accept': 'application/json'}
-
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-    except Exception as e:
-        print(f"Error fetching VATSIM data: {e}")
-        return None
-
-    pilots = data.get('pilots', [])
+def parse_aircraft_data(vatsim_data):
+    pilots = vatsim_data.get('pilots', [])
     result = []
 
     for entry in pilots:
@@ -232,12 +240,11 @@ def fetch_aircraft_data(radius_nm):
             type = flight_plan.get("aircraft_short", "")
             result.append((callsign, departure, arrival, route, lat, lon, alt, heading, speed, type))
 
-    target_lat, target_lon = 41.2129, -82.9431  # DJB VOR
-
+    # Every pilot with a position; the app indexes them by position
     filtered = [
         (callsign, departure, arrival, route, lat, lon, alt, heading, speed, type)
         for callsign, departure, arrival, route, lat, lon, alt, heading, speed, type in result
-        if lat is not None and lon is not None and finddist(target_lat, target_lon, lat, lon) <= radius_nm
+        if lat is not None and lon is not None
     ]
 
     structured = []
@@ -257,26 +264,199 @@ def fetch_aircraft_data(radius_nm):
 
     return structured
 
-def update_aircraft():
-    print("Refreshing aircraft data cache (max radius)...")
-    data = fetch_aircraft_data(radius_nm=MAX_CACHE_RADIUS)
+# The aircraft snapshot this process last wrote, to diff the next one against
+previous_aircraft = {
+    "version": None,
+    "by_callsign": None
+}
+
+def _aircraft_by_callsign(aircraft):
+    return {ac.get("callsign"): ac for ac in aircraft if ac.get("callsign")}
+
+def aircraft_diff(previous, current):
+    """
+    Changes between two {callsign: aircraft} maps: aircraft that appeared
+    (in full), callsigns that disappeared, and for the rest only the fields
+    whose value changed (usually lat/lon/altitude/heading/speed).
+    """
+    added = []
+    changed = []
+    for callsign, ac in current.items():
+        before = previous.get(callsign)
+        if before is None:
+            added.append(ac)
+            continue
+        fields = {key: value for key, value in ac.items() if before.get(key) != value}
+        fields.update({key: None for key in before.keys() - ac.keys()})
+        if fields:
+            changed.append({"callsign": callsign, **fields})
+    removed = [callsign for callsign in previous if callsign not in current]
+    return {"added": added, "removed": removed, "changed": changed}
+
+def load_previous_aircraft():
+    """First run of this process: diff against the snapshot the last run wrote."""
+    doc = aircraft_cache.find_one({"_id": CACHE_KEY}, {"_id": 0, "version": 1, "aircraft": 1})
+    previous_aircraft["version"] = doc.get("version") if doc else None
+    previous_aircraft["by_callsign"] = _aircraft_by_callsign(doc.get("aircraft", [])) if doc else {}
+
+def write_aircraft_delta(by_callsign, version):
+    """
+    Store the diff from the previous snapshot next to the new one, so the app
+    streams it to every subscriber instead of each worker diffing on its own.
+    from/version name the two snapshot versions it connects.
+    """
+    aircraft_delta.replace_one({"_id": CACHE_KEY}, {
+        "from": previous_aircraft["version"],
+        "version": version,
+        **aircraft_diff(previous_aircraft["by_callsign"] or {}, by_callsign)
+    }, upsert=True)
+
+def update_aircraft(vatsim_data):
+    print("Refreshing aircraft data cache (all pilots)...")
+    data = parse_aircraft_data(vatsim_data)
     if data is not None:
         wrapped = {
             "updatedAt": time.ctime(),
-            "aircraft": data
+            "feedUpdatedAt": vatsim_data.get("general", {}).get("update_timestamp"),
+            "aircraft": data,
+            # Tags each aircraft with the ARTCC it is in
+            "artccCounts": tag_artccs(data)
         }
+        by_callsign = _aircraft_by_callsign(data)
+        version = new_version()
+        try:
+            if previous_aircraft["by_callsign"] is None:
+                load_previous_aircraft()
+            # Delta first: workers hear about the snapshot within milliseconds
+            # and look its delta up right away
+            write_aircraft_delta(by_callsign, version)
+        except Exception as e:
+            # Subscribers fall back to the full snapshot
+            print(f"Error writing aircraft delta to MongoDB: {e}")
         try:
-            #clear old cache
-            aircraft_cache.delete_many({})
-            #insert new cache
-            aircraft_cache.insert_one(wrapped)
+            write_snapshot(aircraft_cache, wrapped, version)
             print(f"Aircraft cache updated at {wrapped['updatedAt']}")
         except Exception as e:
             print(f"Error updating aircraft cache in MongoDB: {e}")
+            return False
+        previous_aircraft["version"] = version
+        previous_aircraft["by_callsign"] = by_callsign
+        return True
     else:
         print("No aircraft data fetched; cache not updated.")
+    return False
+
+# Caches derived from the VATSIM feed, with the collection each one writes.
+# The feedUpdatedAt stored there tells which feed it was last built from.
+VATSIM_CONSUMERS = {
+    update_controllers: controller_cache,
+    update_aircraft: aircraft_cache
+}
+built_from = {}
+# Consumers built from vatsim-data.json alone, so an unchanged feed means an
+# unchanged cache. update_controllers also reads the vNAS feed, which changes
+# on its own, so it runs on every pass.
+FEED_ONLY_CONSUMERS = {update_aircraft}
+
+def update_vatsim(consumers=None, max_age=0):
+    """Fetch the VATSIM feed once and fan it out to the consumers whose cache is behind it."""
+    data = fetch_vatsim_feed(max_age)
+    if data is None:
+        print("No VATSIM data fetched; caches not updated.")
+        return False
+
+    stamp = feed_timestamp(data)
+    ok = True
+    for consumer in consumers or VATSIM_CONSUMERS:
+        if consumer not in FEED_ONLY_CONSUMERS:
+            ok = consumer(data) and ok
+            continue
+        if consumer not in built_from:
+            # First run of this process: pick up where the last run left off
+            try:
+                doc = VATSIM_CONSUMERS[consumer].find_one({"_id": CACHE_KEY}, {"_id": 0, "feedUpdatedAt": 1})
+                built_from[consumer] = doc.get("feedUpdatedAt") if doc else None
+            except Exception as e:
+                print(f"Error reading cache from MongoDB: {e}")
+
+        if stamp is not None and built_from.get(consumer) == stamp:
+            print(f"VATSIM feed unchanged since {stamp}; {consumer.__name__} skipped.")
+            continue
+        if consumer(data):
+            built_from[consumer] = stamp
+        else:
+            ok = False
+    return ok
+
+
+# Refresh interval per feed in daemon mode, in seconds
+FEED_INTERVALS = {
+    "aircraft": 15,
+    "controllers": 30,
+    "atis": 120
+}
+MAX_BACKOFF = 300  # seconds
+
+FEED_JOBS = {
+    "aircraft": lambda: update_vatsim([update_aircraft]),
+    # Reuses the aircraft job's download when it is recent enough
+    "controllers": lambda: update_vatsim([update_controllers], max_age=FEED_INTERVALS["aircraft"]),
+    "atis": update_wx
+}
+
+def run_feed(name, job, interval, stop_event):
+    """Run one feed on its own interval; failures back off exponentially with jitter."""
+    failures = 0
+    while not stop_event.is_set():
+        started = time.time()
+        try:
+            ok = job()
+        except Exception as e:
+            print(f"[{name}] refresh raised: {e}")
+            ok = False
+        elapsed = time.time() - started
+
+        if ok:
+            failures = 0
+            delay = max(interval - elapsed, 0)
+        else:
+            failures += 1
+            delay = min(interval * 2 ** failures, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+        print(f"[{name}] {'ok' if ok else 'failed'} in {elapsed:.2f}s, next run in {delay:.1f}s")
+        stop_event.wait(delay)
+
+def run_scheduler(stop_event=None):
+    """
+    Refresh every feed on its own thread and interval, so a slow D-ATIS
+    airport never holds up the aircraft cache. Runs until stop_event is set.
+    """
+    stop_event = stop_event or threading.Event()
+    threads = []
+    for name, job in FEED_JOBS.items():
+        thread = threading.Thread(
+            target=run_feed,
+            args=(name, job, FEED_INTERVALS[name], stop_event),
+            name=f"refresh-{name}",
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
 
 if __name__ == "__main__":
-    update_wx()
-    update_controllers()
-    update_aircraft()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Refresh the ATIS, controller and aircraft caches")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and refresh each feed on its own interval")
+    args = parser.parse_args()
+
+    if args.daemon:
+        stop = threading.Event()
+        run_scheduler(stop)
+        try:
+            while not stop.is_set():
+                stop.wait(3600)
+        except KeyboardInterrupt:
+            stop.set()
+    else:
+        update_wx()
+        update_vatsim()